@@ -8,21 +8,28 @@
 """Arithmetic Activity: A quiz activity for arithmetic."""
 
 from __future__ import with_statement
-import sys, cgitb
+import sys
 
-cgitb.enable(format="plain")
-cgitb.handler = sys.excepthook
+from timing import monotonic, SessionClock, StartupTimer
+_import_started = monotonic()
+
+def _excepthook(*args):
+    # cgitb is slow to import, and only needed once something has gone
+    # wrong.
+    import cgitb
+    cgitb.handler = cgitb.Hook(format="plain")
+    cgitb.handler(*args)
+
+sys.excepthook = _excepthook
 
 import logging
+import bisect
 import gtk
-import pango
-import random
 import gobject
-import math
-import time
+import pango
+import operator
 import os
 import os.path
-import hashlib
 import dobject.groupthink as groupthink
 import dobject.groupthink.gtk_tools as gtk_tools
 import dobject.groupthink.sugar_tools as sugar_tools
@@ -31,6 +38,18 @@ from gettext import gettext as _
 from sugar.activity import activity
 from sugar import profile
 
+from quizengine import QuizEngine, DIFFICULTIES, MAX_WEIGHT, \
+    question_index_at
+from puzzlecache import PuzzleCache
+from scoreboardview import ScoreboardView
+from publisher import ScorePublisher
+from checkpoint import Checkpointer
+from stats import SessionStats
+from profiling import Instrumentation
+from journal import JournalReader, JournalWriter, JournalError
+import grading
+from scheduler import QuestionScheduler, CountdownTicker
+
 try:
     # 0.86+ toolbar widgets
     from sugar.activity.widgets import ActivityToolbarButton, StopButton
@@ -41,56 +60,71 @@ except ImportError:
     from sugar.activity.activity import ActivityToolbox
     _USE_OLD_TOOLBARS = True
 
+_import_time = monotonic() - _import_started
+
 def score_codec(score_or_opaque, pack_or_unpack):
     v = score_or_opaque
     if pack_or_unpack:
-        return (v.cumulative_score, v.last_score, v.last_time)
+        # An ImmutableScore already is the tuple we send.
+        return v
     else:
-        return ImmutableScore(cumulative_score=v[0],
-                              last_score=v[1],
-                              last_time=v[2],)
+        return tuple.__new__(ImmutableScore, v)
 
-class ImmutableScore(object):
+class ImmutableScore(tuple):
     """An immutable representation of scores suitable for synchronization
-    through Groupthink. The codec function is named score_codec."""
+    through Groupthink. The codec function is named score_codec.
+
+    Scores are stored as a (cumulative_score, last_score, last_time)
+    tuple, without a per-instance __dict__."""
+
+    __slots__ = ()
 
-    def __init__(self, old_score = None, cumulative_score=0, last_score=0, last_time=0.0):
+    def __new__(cls, old_score=None, cumulative_score=0, last_score=0, last_time=0.0):
         """Immutable objects may be constructed in absolute or relative terms.
         Absolute terms are used when old_score is None.
         Relative terms are used when old_score is an ImmutableScore.
         """
-        attrs = [("cumulative_score", lambda a,b: a+b),
-                 ("last_score", lambda a,b: b),
-                 ("last_time", lambda a,b: b)]
         if old_score is not None:
-            for a, u in attrs:
-                setattr(self, '_'+a, u(getattr(old_score, a), locals()[a]))
-        else:
-            for a, u in attrs:
-                setattr(self, '_'+a, locals()[a])
-
-    def _get_cumulative_score(self):
-        return self._cumulative_score
-    cumulative_score = property(_get_cumulative_score)
+            cumulative_score += old_score[0]
+        return tuple.__new__(cls, (cumulative_score, last_score, last_time))
 
-    def _get_last_score(self):
-        return self._last_score
-    last_score = property(_get_last_score)
-
-    def _get_last_time(self):
-        return self._last_time
-    last_time = property(_get_last_time)
+    cumulative_score = property(operator.itemgetter(0))
+    last_score = property(operator.itemgetter(1))
+    last_time = property(operator.itemgetter(2))
 
 class ArithmeticActivity(groupthink.sugar_tools.GroupActivity):
     """Arithmetic Activity as specified in activity.info"""
-    DIFFICULTY_EASY     = False
-    DIFFICULTY_MEDIUM   = False
-    DIFFICULTY_HARD     = False
+    SCOREBOARD_ROWS     = 50
+    # Seconds after which a score change is published even if the round
+    # is not over yet; None publishes once per round.
+    SCORE_FLUSH_INTERVAL = None
+    # Seconds between session checkpoints for late joiners, and seconds
+    # the scoreboard has to confirm the players a checkpoint shows.
+    CHECKPOINT_INTERVAL = 30
+    CHECKPOINT_GRACE = 30
+    # Show the seconds left until the next question.
+    SHOW_COUNTDOWN = True
+    # Instrument the callbacks (see profiling.py); the ARITHMETIC_PROFILE
+    # environment variables override these.
+    PROFILE = False
+    PROFILE_SECONDS = 0
+    PROFILE_FILE = None
+    # Puzzles run in this many worker processes, so that a slow or
+    # hostile puzzle cannot freeze the activity; 0 runs them in-process.
+    SANDBOX_WORKERS = 1
+    # Seconds a puzzle may take, seconds more it may take to load (which
+    # includes building its tables), and questions computed ahead.
+    PUZZLE_TIMEOUT = 2.0
+    PUZZLE_LOAD_TIMEOUT = 30.0
+    PREFETCH_AHEAD = 3
 
     def __init__(self, handle):
+        self.startup = StartupTimer()
+        self.startup.add("imports", _import_time)
         super(ArithmeticActivity, self).__init__(handle)
 
         self._configure_toolbars()
+        self.startup.mark("toolbars")
 
     def _configure_toolbars(self):
         if _USE_OLD_TOOLBARS:
@@ -139,55 +173,72 @@ class ArithmeticActivity(groupthink.sugar_tools.GroupActivity):
 
     period = property(_get_period)
 
+    def _get_t0(self):
+        return self.engine.t0
+
     def initialize_display(self):
-        """Set up the Arithmetic activity."""
+        """Set up the Arithmetic activity.  Only what is needed to show
+        the window is done here; puzzles are loaded and the first question
+        asked from an idle callback, once the window is on screen."""
+        self.startup.mark("sharing setup")
         self._logger = logging.getLogger('arithmetic-activity')
+        self.instrumentation = Instrumentation.from_environment(
+            self.PROFILE, self.PROFILE_SECONDS, self.PROFILE_FILE)
+        self.instrumentation.start()
+        # Wrapped before they are handed out as callbacks.
+        for name in ("new_question_cb", "start_question", "new_puzzles_cb",
+                     "solve"):
+            self.instrumentation.wrap(self, name)
         self.starttime = 0
         self.endtime = 0
         self.secondsleft = ""
         self.question = ""
         self.answer = ""
+        self.expected = None
+        self.question_pending = False
+        self.mode = None
+        self.difficulty = None
+        self.stats = SessionStats()
+        self._cumulative_scores = {}
         self.cloud.scoreboard = groupthink.CausalDict(value_translator=score_codec)
         self.scoreboard = self.cloud.scoreboard
         self.mynickname = profile.get_nick_name()
-        self.scoreboard[self.mynickname] = ImmutableScore()
-        self._question_index = 0
-        self._puzzle_hashes = set()
-        self._puzzle_code = {}
-        self._active_mode_hashes = set()
+        self.scoreboard[self.mynickname] = self._open_journal()
+        cachedir = os.path.join(self.get_activity_root(), 'data', 'puzzles')
+        self.engine = QuizEngine(cache=PuzzleCache(cachedir),
+                                 execute=not self.SANDBOX_WORKERS)
+        self._start_sandbox()
+        self.instrumentation.wrap(self.engine, "generate_problem", "get_problem")
+        self.instrumentation.wrap(self.engine, "add_puzzle")
+        self._mode_keys = []
+        self.startup.mark("journal")
 
         # Main layout
         vbox = gtk.VBox()
 
         # Set a startpoint for a shared seed
-        self.cloud.startpoint = groupthink.HighScore(self.timer.time(), 0)
+        # Question boundaries follow the shared clock, read through a
+        # SessionClock so that adjustments of the system time don't make
+        # them jump.  Answer times are measured with monotonic().
+        self.clock = SessionClock(self.timer)
+        self.cloud.startpoint = groupthink.HighScore(self.clock.time(), 0)
+        self.engine.startpoint = self.cloud.startpoint
+        self.scheduler = QuestionScheduler(self.clock, self._get_t0,
+                                           self._get_period,
+                                           self.new_question_cb)
+        self.cloud.startpoint.register_listener(self._startpoint_cb)
 
         # Scoreboard
         scorebox = gtk.VBox()
-        self.model = gtk.TreeStore(gobject.TYPE_STRING, # name
-                                   gobject.TYPE_INT,    # last round score
-                                   gobject.TYPE_INT,    # total score
-                                   gobject.TYPE_FLOAT)  # time for last question
-        self.treeview = treeview = gtk.TreeView(self.model)
-        cellrenderer = gtk.CellRendererText()
-        col1 = gtk.TreeViewColumn(_("Name"), cellrenderer, text=0)
-        col2 = gtk.TreeViewColumn(_("Round score"), cellrenderer, text=1)
-        col3 = gtk.TreeViewColumn(_("Total score"), cellrenderer, text=2)
-        col4 = gtk.TreeViewColumn(_("Time for answering last question"), cellrenderer, text=3)
-        treeview.append_column(col1)
-        treeview.append_column(col2)
-        treeview.append_column(col3)
-        treeview.append_column(col4)
-
-        my_score = self.scoreboard[self.mynickname]
-
-        self.olditer = self.model.insert_before(None, None)
-        self.model.set_value(self.olditer, 0, self.mynickname)
-        self.model.set_value(self.olditer, 1, my_score.last_score)
-        self.model.set_value(self.olditer, 2, my_score.cumulative_score)
-        self.model.set_value(self.olditer, 3, my_score.last_time)
-        treeview.expand_all()
-        scorebox.pack_start(treeview)
+        self.scoreview = ScoreboardView(self.scoreboard, me=self.mynickname,
+                                        limit=self.SCOREBOARD_ROWS)
+        self.publisher = ScorePublisher(self.scoreboard, self.mynickname,
+                                        self.SCORE_FLUSH_INTERVAL)
+        self.instrumentation.wrap(self.scoreview, "update_score")
+        self.instrumentation.wrap(self.scoreview, "_refresh_rows",
+                                  "refresh_scoreboard")
+        self.publisher.register_listener(self.scoreview.update_score)
+        scorebox.pack_start(self.scoreview)
 
         # Horizontal fields
         difficultybox = gtk.HBox()
@@ -214,6 +265,13 @@ class ArithmeticActivity(groupthink.sugar_tools.GroupActivity):
         self.lastanswerlabel = gtk.Label("")
         staticcountdownlabel = gtk.Label(_("Time until next question: "))
         self.countdownlabel  = gtk.Label("")
+        self.countdown = None
+        if self.SHOW_COUNTDOWN:
+            self.countdown = CountdownTicker(self.clock, self._get_t0,
+                                             self._get_period,
+                                             self.countdownlabel)
+            self.instrumentation.wrap(self.countdown, "_tick_cb",
+                                      "countdown_tick")
 
         # ToggleButtons for difficulty
         self.cloud.easytoggle      = groupthink.gtk_tools.SharedToggleButton("< 10")
@@ -227,6 +285,12 @@ class ArithmeticActivity(groupthink.sugar_tools.GroupActivity):
         self.cloud.mediumtoggle.connect("toggled", self.medium_cb)
         self.cloud.hardtoggle.connect("toggled", self.hard_cb)
 
+        # Weights of the puzzles and difficulties, keyed by puzzle hash or
+        # difficulty name.  Only weights other than 1 are stored.
+        self.cloud.weights = groupthink.CausalDict()
+        self.cloud.weights.register_listener(self._weights_cb)
+        self._weight_entries = {}
+
         # Entry for puzzle period
         self.cloud.periodentry = groupthink.gtk_tools.RecentEntry(max=2)
         self.cloud.periodentry.modify_font(pango.FontDescription("Mono 14"))
@@ -238,6 +302,15 @@ class ArithmeticActivity(groupthink.sugar_tools.GroupActivity):
         self.cloud.puzzles         = groupthink.AddOnlySet()
         self.cloud.puzzles.register_listener(self.new_puzzles_cb)
 
+        # Session checkpoints, so that joiners need not wait for the
+        # whole scoreboard and puzzle history.
+        self.cloud.checkpoint = groupthink.HighScore("", 0)
+        self.checkpointer = Checkpointer(self.cloud.checkpoint, self.clock,
+                                         self._get_checkpoint_state,
+                                         self._load_checkpoint,
+                                         self.CHECKPOINT_INTERVAL)
+        self.scoreboard.register_listener(self._scoreboard_changed_cb)
+
         # Text entry box for question
         self.questionentry = gtk.TextView()
         self.questionentry.modify_font(pango.FontDescription("Mono 14"))
@@ -255,9 +328,11 @@ class ArithmeticActivity(groupthink.sugar_tools.GroupActivity):
 
         # Packing
         difficultybox.pack_start(difficultylabel, expand=False)
-        difficultybox.pack_start(self.cloud.easytoggle, expand=False)
-        difficultybox.pack_start(self.cloud.mediumtoggle, expand=False)
-        difficultybox.pack_start(self.cloud.hardtoggle, expand=False)
+        for difficulty in DIFFICULTIES:
+            toggle = getattr(self.cloud, difficulty + "toggle")
+            difficultybox.pack_start(toggle, expand=False)
+            difficultybox.pack_start(self._weight_entry(difficulty),
+                                     expand=False)
 
         periodbox.pack_start(periodlabel, expand=False)
         periodbox.pack_start(self.cloud.periodentry, expand=False)
@@ -281,7 +356,8 @@ class ArithmeticActivity(groupthink.sugar_tools.GroupActivity):
         countdownbox.pack_start(staticcountdownlabel, expand=False)
         countdownbox.pack_start(self.countdownlabel, expand=False)
 
-        bottomrowbox.pack_start(countdownbox)
+        if self.countdown is not None:
+            bottomrowbox.pack_start(countdownbox)
         bottomrowbox.pack_end(lastroundbox)
 
         vbox.pack_start(toprowbox, expand=False)
@@ -289,24 +365,39 @@ class ArithmeticActivity(groupthink.sugar_tools.GroupActivity):
         vbox.pack_start(questionbox, expand=False)
         vbox.pack_start(answerbox, expand=False)
         vbox.pack_start(decisionbox, expand=False)
-        vbox.pack_start(countdownbox, expand=False)
+        if self.countdown is not None:
+            vbox.pack_start(countdownbox, expand=False)
         vbox.pack_start(bottomrowbox, expand=False)
         vbox.pack_start(scorebox)
 
+        self.answerentry.grab_focus()
+        self.lastanswerlabel.set_markup("")
+        gobject.idle_add(self._finish_startup)
+        self.startup.mark("display")
+        return vbox
+
+    def _finish_startup(self):
+        self.startup.mark("first frame")
         # Set defaults for questions.
         self.setup_puzzles()
         self.cloud.easytoggle.set_active(True)
+        self.startup.mark("puzzles")
 
-        # Make a new question.
-        self.generate_new_question()
+        # Make a new question.  The scheduler then waits for the one
+        # after it, rather than reporting the current one again.
+        self.engine.question_index = question_index_at(
+            self._get_t0(), self.period, self.clock.time())
         self.start_question()
-        self.start_countdown()
-        self.answerentry.grab_focus()
-        self.lastanswerlabel.set_markup("")
-        return vbox
+        self.scheduler.start(self.engine.question_index)
+        if self.countdown is not None:
+            self.countdown.start()
+        self.checkpointer.start()
+        self.startup.mark("first question")
+        self._logger.info("Started in %s", self.startup.report())
+        return False
 
     def when_initiating_sharing(self):
-        self.cloud.startpoint.set_value(self.timer.time(), 1)
+        self.cloud.startpoint.set_value(self.clock.time(), 1)
 
     def generate_new_question(self):
         # This requires a fairly large comment.
@@ -331,62 +422,118 @@ class ArithmeticActivity(groupthink.sugar_tools.GroupActivity):
         # We decided to go for 1), using Groupthink to work out a shared
         # clock, stating that questions start every ten seconds, and
         # using a shared seed -- self.cloud.startpoint -- plus a question
-        # index.
-        t0 = self.cloud.startpoint.get_value()
-        random.seed((t0, self._question_index))
-
-        difficultylist = list()
-        if self.DIFFICULTY_EASY:
-            difficultylist.append("easy")
-        if self.DIFFICULTY_MEDIUM:
-            difficultylist.append("medium")
-        if self.DIFFICULTY_HARD:
-            difficultylist.append("hard")
-
-        # This requires a fairly large comment.
-        if len(self._active_mode_hashes) > 0 and len(difficultylist) > 0:
-            mode = random.choice(list(self._active_mode_hashes))
-            difficulty = random.choice(difficultylist)
-            self.question, self.answer = self.generate_problem(mode, difficulty)
+        # index.  The questions themselves are generated by self.engine,
+        # which knows nothing about GTK, or computed ahead by puzzle
+        # worker processes.
+        ready, problem = self._current_problem()
+        if ready and problem is None and self._mode_keys:
+            # No puzzle is selected, so select the first one.
+            self.cloud[self._mode_keys[0][1] + "_toggle"].set_active(True)
+            ready, problem = self._current_problem()
+        self.question_pending = not ready
+        if self.prefetcher is not None and \
+                problem is self.prefetcher.FAILED:
+            # The puzzle failed or took too long; the toggles are shared,
+            # so they are left alone.
+            self.question = _("This puzzle could not make a question.")
+            self.answer = ""
+            self.expected = None
+            self.mode = self.difficulty = None
+        elif problem is not None:
+            self.mode, self.difficulty, self.question, self.answer = problem
+            # Normalized once here, so grading is a single comparison.
+            self.expected = grading.normalize_answer(self.answer)
         else:
-            self.inner_modebox.get_children()[0].set_active(True)
             self.question = self.answer = ""
-
-    def generate_problem(self, mode, difficulty):
-        mode_dict = self._puzzle_code[mode]
-        get_problem = mode_dict['get_problem']
-        return get_problem(self, difficulty)
-
-    def generate_number(self, difficulty, lessthan=0):
-        if difficulty == "easy":
-            return random.randint(1, lessthan or 9)
-        if difficulty == "medium":
-            return random.randint(1, lessthan or 19)
-        if difficulty == "hard":
-            return random.randint(1, lessthan or 50)
-        else:
-            raise AssertionError
+            self.expected = None
+            self.mode = self.difficulty = None
+
+    def _current_problem(self):
+        """Return (ready, problem): the current question, if it is known
+        yet."""
+        if self.prefetcher is None:
+            return True, self.engine.current_question()
+        ready, problem = self.prefetcher.get(self.engine.question_index)
+        self._poll_sandbox()
+        return ready, problem
+
+    def _start_sandbox(self):
+        self.sandbox = None
+        self.prefetcher = None
+        self._sandbox_source = None
+        if not self.SANDBOX_WORKERS:
+            return
+        # Imported here, as it brings in multiprocessing, which
+        # in-process puzzles do not need.
+        from sandbox import PuzzleSandbox, QuestionPrefetcher
+        try:
+            self.sandbox = PuzzleSandbox(
+                self.engine, self.SANDBOX_WORKERS, self.PUZZLE_TIMEOUT,
+                record=self.instrumentation.record,
+                load_timeout=self.PUZZLE_LOAD_TIMEOUT)
+        except (OSError, IOError), e:
+            # No puzzles are loaded yet, so the engine can still switch
+            # to running them itself.
+            self._logger.warning("Running puzzles in-process: %s", e)
+            self.engine.execute = True
+            return
+        self.prefetcher = QuestionPrefetcher(self.engine, self.sandbox,
+                                             self.PREFETCH_AHEAD,
+                                             self._question_ready_cb)
+
+    def _prefetch_questions(self):
+        """Have the questions after the current one computed, with the
+        current settings."""
+        if getattr(self, 'prefetcher', None) is None:
+            return
+        index = self.engine.question_index
+        if not self.question_pending:
+            index += 1
+        self.prefetcher.prefetch(index)
+        self._poll_sandbox()
+
+    def _poll_sandbox(self):
+        if self._sandbox_source is None and self.sandbox.busy:
+            self._sandbox_source = gobject.timeout_add(20, self._sandbox_cb)
+
+    def _sandbox_cb(self):
+        if self.sandbox.poll():
+            return True
+        self._sandbox_source = None
+        return False
+
+    def _question_ready_cb(self, index):
+        if self.question_pending and index == self.engine.question_index:
+            self.starttime = monotonic()
+            self.generate_new_question()
+            self.questionentry.get_buffer().set_text(self.question)
 
     def solve (self, answer, incorrect=False):
-        try:
-            answer = int(answer)
-        except ValueError:
+        response = grading.parse_answer(answer)
+        if response is None:
             self.answerentry.set_text("")
             self.decisionentry.set_text("")
             return
 
-        self.endtime = time.time()
-        self.model.set_value(self.olditer, 3, self.endtime - self.starttime)
-
-        if int(answer) == int(self.answer):
+        self.endtime = monotonic()
+        latency = self.endtime - self.starttime
+        self.scoreview.set_last_time(self.mynickname, latency)
+        self.stats.record(self.mynickname, self.mode,
+                          response == self.expected, latency)
+        if self.journal is not None and self.mode is not None:
+            self.journal.append(self.engine.question_index, self.mode,
+                                self.difficulty, response,
+                                response == self.expected, latency)
+
+        if response == self.expected:
             self.answercorrect = True
             self.decisionentry.set_text(_("Correct!"))
-            old_score = self.scoreboard[self.mynickname]
+            old_score = self.publisher.score
             new_score = ImmutableScore(old_score=old_score,
                                        cumulative_score=1,
                                        last_score=1,
-                                       last_time=self.endtime - self.starttime,)
-            self.scoreboard[self.mynickname] = new_score
+                                       last_time=latency,)
+            self.publisher.set_score(new_score)
         else:
             self.answercorrect = False
             self.decisionentry.set_text(_("Not correct"))
@@ -400,39 +547,90 @@ class ArithmeticActivity(groupthink.sugar_tools.GroupActivity):
             elif period > 99: self.cloud.periodentry.set_text("60")
         except:
             pass
+        self.scheduler.reschedule()
+
+    def _startpoint_cb(self, value, score):
+        self.scheduler.reschedule()
+        self._prefetch_questions()
 
     def answer_cb(self, answer, incorrect=False):
         self.answergiven = True
         self.solve(self.answerentry.get_text())
 
-    def start_countdown(self):
-        self.secondsleft = self.period
-        gobject.timeout_add(1000, self.onesecond_cb)
-        self.countdownlabel.set_markup(' <span size="xx-large">%s</span>s' % self.secondsleft)
-
-    def onesecond_cb(self):
-        elapsed_time = self.timer.time() - self.cloud.startpoint.get_value()
-        curr_index = int(math.floor(elapsed_time/self.period))
-        time_to_next = self.period - (elapsed_time - (self.period*curr_index))
-        self.secondsleft = int(math.ceil(time_to_next))
-        self.countdownlabel.set_markup(' <span size="xx-large">%s</span>s' % self.secondsleft)
-        if curr_index != self._question_index:
-            self._question_index = curr_index
-            if self.answergiven == False:
-                self.solve("")
-            self.start_question()
-            self.answerentry.set_text("")
-
-        self.model = gtk.TreeStore(gobject.TYPE_STRING, # name
-                                   gobject.TYPE_INT,    # last round score
-                                   gobject.TYPE_INT,    # total score
-                                   gobject.TYPE_FLOAT)  # time for last question
-
-        for person, score in self.scoreboard.iteritems():
-            self.model.append(None, (person, score.last_score, score.cumulative_score, score.last_time))
+    def can_close(self):
+        # Don't lose the last round's score when leaving.
+        self.publisher.flush()
+        self._save_stats()
+        self.instrumentation.dump()
+        if self.sandbox is not None:
+            self.sandbox.close()
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        return super(ArithmeticActivity, self).can_close()
+
+    def _open_journal(self):
+        """Open this activity's answer journal and return the local
+        score, rebuilt from the answers already in it when the activity
+        is resumed or restarted after a crash."""
+        datadir = os.path.join(self.get_activity_root(), 'data')
+        path = os.path.join(datadir, 'journal-%s.bin' % self.get_id())
+        score = ImmutableScore()
+        self.journal = None
+        try:
+            if not os.path.isdir(datadir):
+                os.makedirs(datadir)
+            if os.path.exists(path):
+                reader = JournalReader(path)
+                for record in reader:
+                    self.stats.record(self.mynickname, record.mode,
+                                      record.correct, record.latency)
+                    if record.correct:
+                        score = ImmutableScore(old_score=score,
+                                               cumulative_score=1,
+                                               last_score=1,
+                                               last_time=record.latency)
+                reader.close()
+            self.journal = JournalWriter(path)
+        except JournalError, e:
+            self._logger.warning("Starting a new journal: %s", e)
+            self.journal = self._replace_journal(path)
+        except (IOError, OSError), e:
+            self._logger.warning("Not journaling answers: %s", e)
+        return score
+
+    def _replace_journal(self, path):
+        """Set an unreadable journal aside, or failing that delete it,
+        and start a new one in its place.  Returns None if that fails
+        too."""
+        try:
+            try:
+                os.rename(path, path + '.corrupt')
+            except OSError, e:
+                self._logger.warning("Could not keep the old journal: %s", e)
+                os.remove(path)
+            return JournalWriter(path)
+        except (IOError, OSError, JournalError), e:
+            self._logger.warning("Not journaling answers: %s", e)
+            return None
+
+    def _save_stats(self):
+        path = os.path.join(self.get_activity_root(), 'data', 'stats.json')
+        try:
+            with open(path, 'w') as file:
+                file.write(self.stats.to_json())
+        except (IOError, OSError), e:
+            self._logger.warning("Could not save statistics: %s", e)
 
-        self.treeview.set_model(self.model)
-        return True
+    def new_question_cb(self, index):
+        self.engine.question_index = index
+        self.secondsleft = self.period
+        if self.answergiven == False:
+            self.solve("")
+        # One scoreboard update per round, rather than one per answer.
+        self.publisher.flush()
+        self.start_question()
+        self.answerentry.set_text("")
 
     def start_question(self):
         old_answer = self.answer
@@ -440,9 +638,13 @@ class ArithmeticActivity(groupthink.sugar_tools.GroupActivity):
         old_answergiven = getattr(self, "answergiven", False)
         old_answercorrect = getattr(self, "answercorrect", False)
 
-        self.starttime = time.time()
+        self.starttime = monotonic()
         self.generate_new_question()
-        self.questionentry.get_buffer().set_text(self.question)
+        if self.question_pending:
+            self.questionentry.get_buffer().set_text("...")
+        else:
+            self.questionentry.get_buffer().set_text(self.question)
+        self._prefetch_questions()
         self.answergiven = False
         self.answercorrect = False
         self.answerentry.set_text("")
@@ -459,71 +661,143 @@ class ArithmeticActivity(groupthink.sugar_tools.GroupActivity):
 
 
     def easy_cb(self, toggled):
-        self.DIFFICULTY_EASY = toggled.get_active()
+        self.engine.set_difficulty_active("easy", toggled.get_active())
+        self._prefetch_questions()
         self.answerentry.grab_focus()
 
     def medium_cb(self, toggled):
-        self.DIFFICULTY_MEDIUM = toggled.get_active()
+        self.engine.set_difficulty_active("medium", toggled.get_active())
+        self._prefetch_questions()
         self.answerentry.grab_focus()
 
     def hard_cb(self, toggled):
-        self.DIFFICULTY_HARD = toggled.get_active()
+        self.engine.set_difficulty_active("hard", toggled.get_active())
+        self._prefetch_questions()
         self.answerentry.grab_focus()
 
+    def _weight_entry(self, key):
+        """An entry for the weight of puzzle hash or difficulty key."""
+        digits = len(str(MAX_WEIGHT))
+        entry = gtk.Entry(max=digits)
+        entry.set_width_chars(digits)
+        entry.set_text(str(self.engine.weights.get(key, 1)))
+        entry.connect("changed", self._weight_entry_cb, key)
+        self._weight_entries[key] = entry
+        return entry
+
+    def _weight_entry_cb(self, entry, key):
+        try:
+            weight = int(entry.get_text())
+        except ValueError:
+            # Being edited.
+            return
+        if weight < 1:
+            entry.set_text("1")
+        elif weight > MAX_WEIGHT:
+            entry.set_text(str(MAX_WEIGHT))
+        elif weight != self.cloud.weights.get(key, 1):
+            if weight == 1:
+                del self.cloud.weights[key]
+            else:
+                self.cloud.weights[key] = weight
+
+    def _weights_cb(self, added, removed):
+        changes = dict.fromkeys(removed, 1)
+        changes.update(added)
+        for key, weight in changes.iteritems():
+            try:
+                self.engine.set_weight(key, weight)
+            except ValueError:
+                self._logger.warning("Ignoring weight %r of %s", weight, key)
+                continue
+            entry = self._weight_entries.get(key)
+            if entry is not None and entry.get_text() != str(weight):
+                entry.set_text(str(weight))
+        self._prefetch_questions()
+
     def puzzle_toggle_cb(self, toggled, puzzle_hash):
-        if toggled.get_active():
-            self._active_mode_hashes.add(puzzle_hash)
-        else:
-            self._active_mode_hashes.remove(puzzle_hash)
+        self.engine.set_mode_active(puzzle_hash, toggled.get_active())
+        self._prefetch_questions()
         if hasattr(self, 'answerentry'):
             self.answerentry.grab_focus()
 
     def setup_puzzles(self):
-        puzzle_names = os.listdir("puzzles")
-        puzzle_names.sort()
-        for name in puzzle_names:
-            if name.endswith(".py"):
-                path = os.path.join("puzzles", name)
-                with open(path, 'r') as file:
-                    text = file.read()
-                    self.cloud.puzzles.add(text)
-                    self.new_puzzles_cb(set([text]))
-        self.start_question()
-        self.start_countdown()
+        from catalogue import PuzzleCatalogue
+        # Puzzle packs dropped into the activity's data directory are
+        # loaded after the bundled puzzles.
+        catalogue = PuzzleCatalogue(["puzzles"])
+        packdir = os.path.join(self.get_activity_root(), 'data', 'puzzlepacks')
+        if os.path.isdir(packdir):
+            for name in sorted(os.listdir(packdir)):
+                catalogue.add_path(os.path.join(packdir, name))
+        for entry in catalogue.entries():
+            text = entry.read()
+            self.cloud.puzzles.add(text)
+            self.new_puzzles_cb(set([text]))
 
     def new_puzzles_cb(self, puzzles):
         for text in puzzles:
-            if text.strip() == '':
-                continue
-
-            md = hashlib.sha1()
-            md.update(text)
-            hash = md.digest().encode("hex")
-
-            if hash not in self._puzzle_hashes:
-                self._puzzle_hashes.add(hash)
-
-                env_global = {}
-                env_local = {}
-                exec text in env_global, env_local
-
-                togglename = hash + "_toggle"
-                self.cloud[togglename] = groupthink.gtk_tools.SharedToggleButton(' ' + env_local['name'] + ' ')
-                self.cloud[togglename].set_active(False)
-                self.cloud[togglename].connect("toggled", self.puzzle_toggle_cb, hash)
-                self.cloud[togglename].sort_key = env_local['sort_key']
-
-                self._puzzle_code[hash] = env_local
-
-                kids = self.inner_modebox.get_children()
-                old_size = len(kids)
-
-                for kid in kids:
-                    self.inner_modebox.remove(kid)
-
-                kids.append(self.cloud[togglename])
-
-                kids.sort(key=lambda x: x.sort_key)
-
-                for kid in kids:
-                    self.inner_modebox.pack_start(kid, expand=False)
+            hash = self.engine.add_puzzle(text)
+            if hash is not None:
+                self._add_mode_toggle(hash)
+
+    def _add_mode_toggle(self, hash):
+        env_local = self.engine.get_puzzle(hash)
+
+        togglename = hash + "_toggle"
+        self.cloud[togglename] = groupthink.gtk_tools.SharedToggleButton(' ' + env_local['name'] + ' ')
+        self.cloud[togglename].set_active(False)
+        self.cloud[togglename].connect("toggled", self.puzzle_toggle_cb, hash)
+        self.cloud[togglename].sort_key = env_local['sort_key']
+
+        # Insert the toggle in sort_key order, leaving the others
+        # where they are.
+        key = (env_local['sort_key'], hash)
+        position = bisect.bisect(self._mode_keys, key)
+        self._mode_keys.insert(position, key)
+        modeitem = gtk.HBox()
+        modeitem.pack_start(self.cloud[togglename], expand=False)
+        modeitem.pack_start(self._weight_entry(hash), expand=False)
+        self.inner_modebox.pack_start(modeitem, expand=False)
+        self.inner_modebox.reorder_child(modeitem, position)
+
+    def _scoreboard_changed_cb(self, added, removed):
+        self.checkpointer.mark_dirty()
+        # Other players' answers are only seen as score changes: a rise
+        # in the cumulative score is a correct answer, given in the
+        # score's last_time.
+        for person, score in added.iteritems():
+            previous = self._cumulative_scores.get(person)
+            self._cumulative_scores[person] = score.cumulative_score
+            if person != self.mynickname and previous is not None and \
+                    score.cumulative_score > previous:
+                self.stats.record(person, None, True, score.last_time)
+
+    def _get_checkpoint_state(self):
+        scores = dict((person, score_codec(score, True))
+                      for person, score in self.scoreboard.iteritems())
+        return scores, self.engine.puzzle_hashes()
+
+    def _load_checkpoint(self, scores, puzzle_hashes):
+        """Show a checkpoint's scores until the scoreboard catches up, and
+        load its puzzles from the cache.  Only puzzles that are not in the
+        cache have to wait for their text to arrive."""
+        shown = [person for person in scores if person not in self.scoreboard]
+        for person in shown:
+            self.scoreview.update_score(person,
+                                        score_codec(scores[person], False))
+        if shown:
+            gobject.timeout_add(int(self.CHECKPOINT_GRACE * 1000),
+                                self._drop_unconfirmed_cb, shown)
+        for hash in puzzle_hashes:
+            if not self.engine.has_puzzle(hash) and \
+                    self.engine.add_cached_puzzle(hash):
+                self._add_mode_toggle(hash)
+
+    def _drop_unconfirmed_cb(self, persons):
+        """Remove the players that only a checkpoint has shown, if the
+        scoreboard has not caught up with them by now."""
+        for person in persons:
+            if person not in self.scoreboard:
+                self.scoreview.remove_player(person)
+        return False
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Benchmarks for the hot paths of the Arithmetic activity.
+
+The activity runs on the stand-ins in benchmarks/fakes, so no display,
+Sugar or Groupthink is needed.  Results are written as JSON, one entry per
+benchmark with the mean time per call, so runs can be compared:
+
+    python benchmarks/bench.py -o bench_results.json
+"""
+
+import os
+import sys
+import json
+import time
+import optparse
+import platform
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [os.path.join(BENCH_DIR, "fakes"), ROOT_DIR]
+
+import gobject
+import arithmetic
+
+# Time the puzzles themselves rather than the worker processes.
+arithmetic.ArithmeticActivity.SANDBOX_WORKERS = 0
+from quizengine import DIFFICULTIES
+
+def make_activity():
+    """An ArithmeticActivity on the fakes, with every puzzle and
+    difficulty switched on."""
+    os.chdir(ROOT_DIR)
+    gobject.reset()
+    activity = arithmetic.ArithmeticActivity(None)
+    # Let the activity finish starting up.
+    gobject.run_due(gobject.now())
+    for hash in activity.engine.puzzle_hashes():
+        activity.cloud[hash + "_toggle"].set_active(True)
+    activity.cloud.mediumtoggle.set_active(True)
+    activity.cloud.hardtoggle.set_active(True)
+    return activity
+
+def timeit(function, min_time=0.2):
+    """Mean seconds per call of function(), with the number of calls
+    grown until the measurement takes at least min_time."""
+    number = 1
+    while True:
+        start = time.time()
+        for i in xrange(number):
+            function()
+        elapsed = time.time() - start
+        if elapsed >= min_time:
+            return elapsed / number, number
+        number *= 2 if elapsed <= 0 else max(2, int(min_time / elapsed * 1.2))
+
+class Results(object):
+    def __init__(self, quick=False):
+        self.quick = quick
+        self.entries = []
+
+    def add(self, name, function, **params):
+        seconds, calls = timeit(function, 0.02 if self.quick else 0.2)
+        self.entries.append({"name": name, "params": params,
+                             "seconds_per_call": seconds, "calls": calls})
+        print "%-28s %-36s %12.3f us" % (
+            name, " ".join("%s=%s" % p for p in sorted(params.items())),
+            seconds * 1e6)
+
+def bench_generate_problem(results, activity):
+    engine = activity.engine
+    for mode in sorted(engine.puzzle_hashes()):
+        name = engine.get_puzzle(mode)['name']
+        for difficulty in DIFFICULTIES:
+            counter = [0]
+            def run():
+                counter[0] += 1
+                rng = engine.question_random(engine.t0, counter[0])
+                engine.generate_problem(mode, difficulty, rng)
+            results.add("generate_problem", run,
+                        puzzle=name, difficulty=difficulty)
+
+def bench_score_codec(results, activity):
+    score = arithmetic.ImmutableScore(cumulative_score=12, last_score=1,
+                                      last_time=2.5)
+    codec = arithmetic.score_codec
+    results.add("score_codec_roundtrip",
+                lambda: codec(codec(score, True), False))
+
+def bench_solve(results, activity):
+    def correct():
+        activity.solve(str(activity.answer))
+    def incorrect():
+        activity.solve("-1")
+    results.add("solve", correct, correct=True)
+    results.add("solve", incorrect, correct=False)
+
+def bench_new_puzzles(results, activity, sizes):
+    with open(os.path.join(ROOT_DIR, "puzzles", "addition.py")) as file:
+        template = file.read()
+    run = [0]
+    for n in sizes:
+        def load():
+            # Fresh texts every time, or the engine would skip them all.
+            run[0] += 1
+            texts = set("%s\n# %d %d\n" % (template, run[0], i)
+                        for i in xrange(n))
+            activity.new_puzzles_cb(texts)
+        results.add("new_puzzles_cb", load, puzzles=n)
+
+def bench_scoreboard(results, activity, sizes):
+    scoreboard = activity.scoreboard
+    for n in sizes:
+        players = ["player%d" % i for i in xrange(n)]
+        for player in players:
+            scoreboard[player] = arithmetic.ImmutableScore()
+        def score_round():
+            # Every player answers one question correctly.
+            for player in players:
+                scoreboard[player] = arithmetic.ImmutableScore(
+                    old_score=scoreboard[player], cumulative_score=1,
+                    last_score=1, last_time=1.5)
+        def boundary():
+            activity.new_question_cb(activity.engine.question_index + 1)
+        results.add("scoreboard_round", score_round, players=n)
+        results.add("question_boundary", boundary, players=n)
+        for player in players:
+            del scoreboard[player]
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [options]",
+                                   description=__doc__.split("\n\n")[0])
+    parser.add_option("--output", "-o", default="bench_results.json",
+                      help="JSON results file (default %default)")
+    parser.add_option("--quick", action="store_true", default=False,
+                      help="shorter runs and fewer sizes, for smoke tests")
+    options, args = parser.parse_args(argv)
+
+    if options.quick:
+        puzzle_sizes, player_sizes = (10,), (10, 100)
+    else:
+        puzzle_sizes, player_sizes = (10, 100, 1000), (10, 100, 1000, 10000)
+
+    results = Results(options.quick)
+    activity = make_activity()
+    bench_generate_problem(results, activity)
+    bench_score_codec(results, activity)
+    bench_solve(results, activity)
+    bench_scoreboard(results, activity, player_sizes)
+    bench_new_puzzles(results, activity, puzzle_sizes)
+
+    report = {"time": time.time(),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "results": results.entries}
+    with open(options.output, "w") as file:
+        json.dump(report, file, indent=1, sort_keys=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""A stand-in for Groupthink: shared objects that live in one process."""
+
+from groupthink_base import CausalDict, AddOnlySet, HighScore
+import gtk_tools
+import sugar_tools
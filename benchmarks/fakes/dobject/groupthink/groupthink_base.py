@@ -0,0 +1,143 @@
+"""In-memory versions of the Groupthink shared objects.
+
+Local changes notify listeners at once, as they would in a session with
+nobody else in it.  Changes that arrive from elsewhere are applied with
+the receive_* methods, which is how a simulated network delivers them."""
+
+class _Shared(object):
+    def __init__(self):
+        self._listeners = []
+
+    def register_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _trigger(self, *args):
+        for listener in self._listeners:
+            listener(*args)
+
+class CausalDict(_Shared):
+    """A dict whose changes are reported to listeners as
+    listener(added, removed), both dicts."""
+
+    def __init__(self, value_translator=None):
+        _Shared.__init__(self)
+        self.value_translator = value_translator
+        self._dict = {}
+        # Called with (key, value) for every local change; a simulated
+        # network hooks in here.  value is None for deletions.
+        self.outgoing = None
+
+    def __setitem__(self, key, value):
+        self._set(key, value)
+        if self.outgoing is not None:
+            self.outgoing(key, value)
+
+    def __delitem__(self, key):
+        self._delete(key)
+        if self.outgoing is not None:
+            self.outgoing(key, None)
+
+    def receive_set(self, key, value):
+        self._set(key, value)
+
+    def receive_delete(self, key):
+        if key in self._dict:
+            self._delete(key)
+
+    def _set(self, key, value):
+        removed = {}
+        if key in self._dict:
+            removed[key] = self._dict[key]
+        self._dict[key] = value
+        self._trigger({key: value}, removed)
+
+    def _delete(self, key):
+        value = self._dict.pop(key)
+        self._trigger({}, {key: value})
+
+    def __getitem__(self, key):
+        return self._dict[key]
+
+    def __contains__(self, key):
+        return key in self._dict
+
+    def __iter__(self):
+        return iter(self._dict)
+
+    def __len__(self):
+        return len(self._dict)
+
+    def get(self, key, default=None):
+        return self._dict.get(key, default)
+
+    def keys(self):
+        return self._dict.keys()
+
+    def items(self):
+        return self._dict.items()
+
+    def iteritems(self):
+        return self._dict.iteritems()
+
+class AddOnlySet(_Shared):
+    """A set that only grows.  Listeners get the set of new items."""
+
+    def __init__(self):
+        _Shared.__init__(self)
+        self._set = set()
+        self.outgoing = None
+
+    def add(self, item):
+        if self._receive([item]) and self.outgoing is not None:
+            self.outgoing(item)
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def receive(self, items):
+        self._receive(items)
+
+    def _receive(self, items):
+        new = set(items) - self._set
+        if new:
+            self._set.update(new)
+            self._trigger(new)
+        return bool(new)
+
+    def __contains__(self, item):
+        return item in self._set
+
+    def __iter__(self):
+        return iter(self._set)
+
+    def __len__(self):
+        return len(self._set)
+
+class HighScore(_Shared):
+    """Keeps the value with the highest score; ties go to the higher
+    value.  Listeners are called as listener(value, score)."""
+
+    def __init__(self, value, score):
+        _Shared.__init__(self)
+        self._value = value
+        self._score = score
+        self.outgoing = None
+
+    def get_value(self):
+        return self._value
+
+    def get_score(self):
+        return self._score
+
+    def set_value(self, value, score):
+        if self.receive(value, score) and self.outgoing is not None:
+            self.outgoing(value, score)
+
+    def receive(self, value, score):
+        if (score, value) > (self._score, self._value):
+            self._value = value
+            self._score = score
+            self._trigger(value, score)
+            return True
+        return False
@@ -0,0 +1,10 @@
+"""Stand-ins for the shared widgets of groupthink.gtk_tools.  They are
+plain widgets here; nothing is shared."""
+
+import gtk
+
+class SharedToggleButton(gtk.ToggleButton):
+    pass
+
+class RecentEntry(gtk.Entry):
+    pass
@@ -0,0 +1,44 @@
+"""A stand-in for groupthink.sugar_tools.GroupActivity."""
+
+import time
+
+from sugar.activity import activity
+
+class Cloud(object):
+    """The activity's bag of shared objects, by attribute or by key."""
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+# The local clock of TimeHandlers made without one; a simulation sets
+# this to gobject.now to run on the fake main loop's time.
+default_clock = time.time
+
+class TimeHandler(object):
+    """The shared clock: the local clock plus an offset."""
+
+    def __init__(self, clock=None):
+        self.clock = clock or default_clock
+        self.offset = 0.0
+
+    def time(self):
+        return self.clock() + self.offset
+
+class GroupActivity(activity.Activity):
+    def __init__(self, handle=None):
+        activity.Activity.__init__(self, handle)
+        self.cloud = Cloud()
+        self.timer = TimeHandler()
+        self.set_canvas(self.initialize_display())
+
+    def initialize_display(self):
+        raise NotImplementedError
+
+    def when_initiating_sharing(self):
+        pass
+
+    def share(self):
+        self.when_initiating_sharing()
@@ -0,0 +1,73 @@
+"""A stand-in for gobject: type constants and a manually driven clock
+for timeout_add() and idle_add()."""
+
+import heapq
+import itertools
+
+TYPE_STRING = str
+TYPE_INT = int
+TYPE_FLOAT = float
+TYPE_BOOLEAN = bool
+TYPE_PYOBJECT = object
+
+_now = [0.0]
+_queue = []
+_live = {}
+_ids = itertools.count(1)
+_context = [None]
+
+def now():
+    """The time of the fake main loop, in seconds."""
+    return _now[0]
+
+def set_context(context):
+    """Sources added from now on belong to context, a function that
+    run_due() calls as context(callback, *args) to run them; with None
+    they are run directly.  Returns the previous context."""
+    previous = _context[0]
+    _context[0] = context
+    return previous
+
+def timeout_add(interval, callback, *args):
+    source = next(_ids)
+    _live[source] = (interval, callback, args, _context[0])
+    heapq.heappush(_queue, (_now[0] + interval / 1000.0, source))
+    return source
+
+def timeout_add_seconds(interval, callback, *args):
+    return timeout_add(interval * 1000, callback, *args)
+
+def idle_add(callback, *args):
+    return timeout_add(0, callback, *args)
+
+def source_remove(source):
+    return _live.pop(source, None) is not None
+
+def pending():
+    """The number of live sources."""
+    return len(_live)
+
+def run_due(until):
+    """Advance the fake clock to until, running every source that falls
+    due on the way.  Sources that return True are rearmed, as in GLib."""
+    while _queue and _queue[0][0] <= until:
+        when, source = heapq.heappop(_queue)
+        if source not in _live:
+            continue
+        _now[0] = max(_now[0], when)
+        interval, callback, args, context = _live[source]
+        if context is None:
+            again = callback(*args)
+        else:
+            again = context(callback, *args)
+        if again:
+            heapq.heappush(_queue, (_now[0] + interval / 1000.0, source))
+        else:
+            _live.pop(source, None)
+    _now[0] = max(_now[0], until)
+
+def reset():
+    _now[0] = 0.0
+    del _queue[:]
+    _live.clear()
+    _context[0] = None
@@ -0,0 +1,248 @@
+"""A stand-in for the parts of gtk (PyGTK 2) that the activity uses.
+
+Widgets remember their state and emit the signals that the activity
+connects to, but nothing is ever drawn."""
+
+class Object(object):
+    def __init__(self, *args, **kwargs):
+        self._handlers = {}
+        self._properties = {}
+
+    def connect(self, signal, callback, *args):
+        self._handlers.setdefault(signal, []).append((callback, args))
+        return len(self._handlers[signal])
+
+    def emit(self, signal, *args):
+        for callback, extra in list(self._handlers.get(signal, ())):
+            callback(self, *(args + extra))
+
+    def set_property(self, name, value):
+        self._properties[name] = value
+
+    def get_property(self, name):
+        return self._properties.get(name)
+
+class Widget(Object):
+    def show(self):
+        pass
+
+    def show_all(self):
+        pass
+
+    def hide(self):
+        pass
+
+    def grab_focus(self):
+        pass
+
+    def modify_font(self, font):
+        self.font = font
+
+    def set_size_request(self, width, height):
+        pass
+
+class Container(Widget):
+    def __init__(self, *args, **kwargs):
+        Widget.__init__(self)
+        self._children = []
+
+    def add(self, child):
+        self._children.append(child)
+
+    def pack_start(self, child, expand=True, fill=True, padding=0):
+        self._children.append(child)
+
+    def pack_end(self, child, expand=True, fill=True, padding=0):
+        self._children.append(child)
+
+    def remove(self, child):
+        self._children.remove(child)
+
+    def reorder_child(self, child, position):
+        self._children.remove(child)
+        if position < 0:
+            position = len(self._children)
+        self._children.insert(position, child)
+
+    def get_children(self):
+        return list(self._children)
+
+class VBox(Container):
+    pass
+
+class HBox(Container):
+    pass
+
+class Toolbar(Container):
+    def insert(self, item, position):
+        if position < 0:
+            position = len(self._children)
+        self._children.insert(position, item)
+
+class ToolItem(Widget):
+    def set_expand(self, expand):
+        self.expand = expand
+
+class SeparatorToolItem(ToolItem):
+    def __init__(self):
+        ToolItem.__init__(self)
+        self.props = _Props()
+
+class _Props(object):
+    pass
+
+class Label(Widget):
+    def __init__(self, text=""):
+        Widget.__init__(self)
+        self._text = text
+
+    def set_text(self, text):
+        self._text = text
+
+    def set_markup(self, markup):
+        self._text = markup
+
+    def get_text(self):
+        return self._text
+
+class Entry(Widget):
+    def __init__(self, max=0):
+        Widget.__init__(self)
+        self._max = max
+        self._text = ""
+
+    def set_text(self, text):
+        if self._max:
+            text = text[:self._max]
+        if text != self._text:
+            self._text = text
+            self.emit("changed")
+
+    def get_text(self):
+        return self._text
+
+    def set_width_chars(self, n):
+        pass
+
+    def activate(self):
+        self.emit("activate")
+
+class TextBuffer(Object):
+    def __init__(self):
+        Object.__init__(self)
+        self._text = ""
+
+    def set_text(self, text):
+        self._text = text
+
+    def get_text(self, *args):
+        return self._text
+
+class TextView(Widget):
+    def __init__(self):
+        Widget.__init__(self)
+        self._buffer = TextBuffer()
+
+    def get_buffer(self):
+        return self._buffer
+
+class ToggleButton(Widget):
+    def __init__(self, label=""):
+        Widget.__init__(self)
+        self.label = label
+        self._active = False
+
+    def set_active(self, active):
+        active = bool(active)
+        if active != self._active:
+            self._active = active
+            self.emit("toggled")
+
+    def get_active(self):
+        return self._active
+
+class TreeStore(Object):
+    """Rows are lists; an iter is the row itself and stays valid until the
+    row is removed, like the iters of a real TreeStore."""
+
+    def __init__(self, *types):
+        Object.__init__(self)
+        self._types = types
+        self._rows = []
+
+    def _new_row(self, values):
+        if values is None:
+            return [t() for t in self._types]
+        return list(values)
+
+    def append(self, parent, values=None):
+        row = self._new_row(values)
+        self._rows.append(row)
+        return row
+
+    def insert_before(self, parent, sibling, values=None):
+        row = self._new_row(values)
+        if sibling is None:
+            self._rows.append(row)
+        else:
+            self._rows.insert(self._index(sibling), row)
+        return row
+
+    def _index(self, it):
+        for i, row in enumerate(self._rows):
+            if row is it:
+                return i
+        raise ValueError("iter is not in this model")
+
+    def set_value(self, it, column, value):
+        it[column] = self._types[column](value)
+
+    def get_value(self, it, column):
+        return it[column]
+
+    def remove(self, it):
+        del self._rows[self._index(it)]
+        return False
+
+    def reorder(self, parent, new_order):
+        self._rows = [self._rows[i] for i in new_order]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter([tuple(row) for row in self._rows])
+
+ListStore = TreeStore
+
+class CellRendererText(Object):
+    pass
+
+class TreeViewColumn(Object):
+    def __init__(self, title="", cell=None, **attributes):
+        Object.__init__(self)
+        self.title = title
+
+class TreeView(Container):
+    def __init__(self, model=None):
+        Container.__init__(self)
+        self._model = model
+        self._columns = []
+
+    def append_column(self, column):
+        self._columns.append(column)
+
+    def set_model(self, model):
+        self._model = model
+
+    def get_model(self):
+        return self._model
+
+    def expand_all(self):
+        pass
+
+def main():
+    pass
+
+def main_quit():
+    pass
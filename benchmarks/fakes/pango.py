@@ -0,0 +1,5 @@
+"""A stand-in for pango."""
+
+class FontDescription(object):
+    def __init__(self, description=""):
+        self.description = description
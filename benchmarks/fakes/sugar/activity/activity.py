@@ -0,0 +1,53 @@
+"""A stand-in for sugar.activity.activity."""
+
+import os
+import tempfile
+
+import gtk
+
+_activity_root = []
+
+def get_activity_root():
+    """A private scratch directory per process, unless
+    SUGAR_ACTIVITY_ROOT says otherwise."""
+    root = os.environ.get("SUGAR_ACTIVITY_ROOT")
+    if root:
+        return root
+    if not _activity_root:
+        _activity_root.append(tempfile.mkdtemp(prefix="arithmetic-"))
+    return _activity_root[0]
+
+class Activity(gtk.Container):
+    def __init__(self, handle=None):
+        gtk.Container.__init__(self)
+        self.handle = handle
+        self.canvas = None
+
+    def get_activity_root(self):
+        return get_activity_root()
+
+    def get_id(self):
+        return getattr(self.handle, "activity_id", None) or "activity"
+
+    def set_canvas(self, canvas):
+        self.canvas = canvas
+
+    def set_toolbox(self, toolbox):
+        self.toolbox = toolbox
+
+    def set_toolbar_box(self, toolbar_box):
+        self.toolbar_box = toolbar_box
+
+    def can_close(self):
+        return True
+
+    def close(self):
+        if self.can_close():
+            self.destroy()
+
+    def destroy(self):
+        pass
+
+class ActivityToolbox(gtk.Toolbar):
+    def __init__(self, activity):
+        gtk.Toolbar.__init__(self)
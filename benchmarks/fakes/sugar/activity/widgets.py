@@ -0,0 +1,12 @@
+"""A stand-in for sugar.activity.widgets."""
+
+import gtk
+
+class ActivityToolbarButton(gtk.ToolItem):
+    def __init__(self, activity):
+        gtk.ToolItem.__init__(self)
+
+class StopButton(gtk.ToolItem):
+    def __init__(self, activity):
+        gtk.ToolItem.__init__(self)
+        self.props = gtk._Props()
@@ -0,0 +1,12 @@
+"""A stand-in for sugar.graphics.toolbarbox."""
+
+import gtk
+
+class ToolbarBox(gtk.VBox):
+    def __init__(self):
+        gtk.VBox.__init__(self)
+        self.toolbar = gtk.Toolbar()
+
+class ToolbarButton(gtk.ToolItem):
+    def __init__(self, **kwargs):
+        gtk.ToolItem.__init__(self)
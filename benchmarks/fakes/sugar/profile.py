@@ -0,0 +1,9 @@
+"""A stand-in for sugar.profile."""
+
+import os
+
+def get_nick_name():
+    return os.environ.get("ARITHMETIC_NICK", "player")
+
+def get_color():
+    return None
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Load simulation of a shared Arithmetic session.
+
+N virtual players each run a real ArithmeticActivity on the stand-ins in
+benchmarks/fakes.  Their shared objects (the scoreboard, the puzzle set
+and the startpoint and checkpoint HighScores) are connected by a
+simulated network with configurable latency, jitter and reordering.  The
+players answer the questions they are shown through the activity's own
+answer entry, so questions, grading, scores and publishing all take the
+real code paths.
+
+Everything runs in one process on the fake main loop's virtual time, so
+a session of many rounds takes seconds, and runs with the same --seed
+are repeatable.  CPU time is charged to the player whose callback is
+running.  The report gives the time the scoreboards take to converge
+after a change, the messages sent per round and the CPU time used per
+player per round:
+
+    python benchmarks/loadsim.py --players 30 --rounds 20 --latency 80
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import optparse
+import itertools
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [os.path.join(BENCH_DIR, "fakes"), ROOT_DIR]
+
+import gobject
+import dobject.groupthink as groupthink
+import dobject.groupthink.sugar_tools as sugar_tools
+import timing
+import arithmetic
+
+try:
+    _cpu_time = time.process_time
+except AttributeError:
+    # Processor time on Unix.
+    _cpu_time = time.clock
+
+def use_virtual_time():
+    """Make every clock the activity reads follow the fake main loop.
+    Puzzle worker processes would run on real time, so puzzles are run
+    in-process."""
+    arithmetic.ArithmeticActivity.SANDBOX_WORKERS = 0
+    sugar_tools.default_clock = gobject.now
+    timing.monotonic = gobject.now
+    arithmetic.monotonic = gobject.now
+
+def _mean(values):
+    return values and sum(values) / float(len(values)) or 0.0
+
+class _Handle(object):
+    def __init__(self, activity_id):
+        self.activity_id = activity_id
+
+class Player(object):
+    """A virtual player: an ArithmeticActivity and a way of answering."""
+
+    def __init__(self, number, rng, answer_rate, accuracy, think_time):
+        self.name = "player%03d" % number
+        self.cpu = 0.0
+        self._rng = rng
+        self._answer_rate = answer_rate
+        self._accuracy = accuracy
+        self._think_time = think_time
+        os.environ["ARITHMETIC_NICK"] = self.name
+        self.activity = self.run(arithmetic.ArithmeticActivity,
+                                 _Handle(self.name))
+        start_question = self.activity.start_question
+
+        def question_started():
+            start_question()
+            self._question_started()
+        self.activity.start_question = question_started
+
+    def run(self, callback, *args):
+        """Run callback as this player, charging it the CPU time."""
+        previous = gobject.set_context(self.run)
+        started = _cpu_time()
+        try:
+            return callback(*args)
+        finally:
+            self.cpu += _cpu_time() - started
+            gobject.set_context(previous)
+
+    def _question_started(self):
+        if self.activity.expected is None or \
+                self._rng.random() >= self._answer_rate:
+            return
+        delay = self._rng.expovariate(1.0 / self._think_time)
+        gobject.timeout_add(int(delay * 1000), self._answer_cb,
+                            self.activity.engine.question_index)
+
+    def _answer_cb(self, index):
+        activity = self.activity
+        if activity.engine.question_index == index and \
+                activity.expected is not None:
+            if self._rng.random() < self._accuracy:
+                answer = activity.expected
+            else:
+                answer = activity.expected + 1
+            activity.answerentry.set_text(str(answer))
+            activity.answer_cb(activity.answerentry)
+        return False
+
+class Network(object):
+    """Carries the changes of each player's shared objects to every other
+    player after a random delay.
+
+    A message is delayed by latency plus up to jitter seconds, and with
+    probability reorder by up to reorder_delay seconds more, so that
+    later messages can overtake it.  Scoreboard entries are stamped, and
+    a receiver ignores a value older than the one it has, as Groupthink's
+    CausalDict does."""
+
+    def __init__(self, rng, latency, jitter, reorder, reorder_delay):
+        self._rng = rng
+        self._latency = latency
+        self._jitter = jitter
+        self._reorder = reorder
+        self._reorder_delay = reorder_delay
+        self._players = []
+        self._stamps = itertools.count()
+        # (player name, object name, key) -> newest stamp received
+        self._received = {}
+        self._in_flight = 0
+        self._diverged_since = None
+        # (send time, object name, size in bytes) of every message
+        self.messages = []
+        self.deliveries = 0
+        self.convergence_times = []
+        self.mismatches = 0
+
+    def connect(self, player):
+        self._players.append(player)
+        for name, shared in vars(player.activity.cloud).items():
+            if hasattr(shared, "outgoing"):
+                shared.outgoing = self._outgoing(player, name, shared)
+
+    def _outgoing(self, sender, name, shared):
+        translator = getattr(shared, "value_translator", None)
+
+        def send(*payload):
+            if isinstance(shared, groupthink.CausalDict):
+                key, value = payload
+                if value is not None and translator is not None:
+                    value = translator(value, True)
+                payload = (key, value, next(self._stamps))
+            self.send(sender, name, payload)
+        return send
+
+    def sync(self):
+        """Exchange the state the players had before they were
+        connected, as a join does."""
+        for player in self._players:
+            scoreboard = player.activity.scoreboard
+            for key, value in scoreboard.items():
+                if key == player.name:
+                    scoreboard.outgoing(key, value)
+
+    def send(self, sender, name, payload):
+        self.messages.append((gobject.now(), name, len(repr(payload))))
+        if name == "scoreboard" and self._diverged_since is None:
+            self._diverged_since = gobject.now()
+        for player in self._players:
+            if player is sender:
+                continue
+            delay = self._latency + self._rng.uniform(0, self._jitter)
+            if self._rng.random() < self._reorder:
+                delay += self._rng.uniform(0, self._reorder_delay)
+            # Delivered as the receiver, so it pays for the work.
+            previous = gobject.set_context(player.run)
+            gobject.timeout_add(int(delay * 1000), self._deliver_cb,
+                                player, name, payload)
+            gobject.set_context(previous)
+            self._in_flight += 1
+
+    def _deliver_cb(self, player, name, payload):
+        self._in_flight -= 1
+        self.deliveries += 1
+        shared = getattr(player.activity.cloud, name)
+        if isinstance(shared, groupthink.CausalDict):
+            key, value, stamp = payload
+            newest = (player.name, name, key)
+            if stamp > self._received.get(newest, -1):
+                self._received[newest] = stamp
+                if value is None:
+                    shared.receive_delete(key)
+                else:
+                    translator = shared.value_translator
+                    if translator is not None:
+                        value = translator(value, False)
+                    shared.receive_set(key, value)
+        elif isinstance(shared, groupthink.AddOnlySet):
+            shared.receive(payload)
+        else:
+            shared.receive(*payload)
+        if self._in_flight == 0 and self._diverged_since is not None:
+            self._check_converged()
+        return False
+
+    def _check_converged(self):
+        self.convergence_times.append(gobject.now() - self._diverged_since)
+        self._diverged_since = None
+        boards = [dict(player.activity.scoreboard.items())
+                  for player in self._players]
+        for board in boards[1:]:
+            if board != boards[0]:
+                self.mismatches += 1
+
+def simulate(options):
+    rng = random.Random(options.seed)
+    gobject.reset()
+    use_virtual_time()
+    network = Network(rng, options.latency / 1000.0, options.jitter / 1000.0,
+                      options.reorder, options.reorder_delay / 1000.0)
+    players = []
+    for number in xrange(options.players):
+        player = Player(number, random.Random(rng.random()),
+                        options.answer_rate, options.accuracy,
+                        options.think_time)
+        # Clocks are never quite in step.
+        player.activity.timer.offset = rng.uniform(-options.skew, options.skew)
+        player.run(player.activity.cloud.periodentry.set_text,
+                   str(options.period))
+        network.connect(player)
+        players.append(player)
+    # Let every activity finish starting up, then open the session.
+    gobject.run_due(gobject.now())
+    network.sync()
+    players[0].run(players[0].activity.share)
+
+    started = gobject.now()
+    cpu_before = [player.cpu for player in players]
+    messages_before = len(network.messages)
+    duration = options.rounds * options.period
+    gobject.run_due(started + duration)
+    # Let the last round's messages arrive.
+    gobject.run_due(gobject.now() + options.period)
+
+    per_round = {}
+    for sent, name, size in network.messages[messages_before:]:
+        index = int((sent - started) // options.period)
+        count, total = per_round.get(index, (0, 0))
+        per_round[index] = (count + 1, total + size)
+    counts = [per_round.get(i, (0, 0))[0] for i in xrange(options.rounds)]
+    sizes = [per_round.get(i, (0, 0))[1] for i in xrange(options.rounds)]
+    cpu = [(player.cpu - before) / options.rounds
+           for player, before in zip(players, cpu_before)]
+    scores = [player.activity.publisher.score.cumulative_score
+              for player in players]
+    for player in players:
+        player.run(player.activity.close)
+
+    return {"players": options.players,
+            "rounds": options.rounds,
+            "period": options.period,
+            "latency_ms": options.latency,
+            "jitter_ms": options.jitter,
+            "reorder": options.reorder,
+            "convergence_s": {
+                "count": len(network.convergence_times),
+                "mean": _mean(network.convergence_times),
+                "max": max(network.convergence_times or [0.0])},
+            "scoreboard_mismatches": network.mismatches,
+            "messages_per_round": {"mean": _mean(counts),
+                                   "max": max(counts or [0])},
+            "bytes_per_round": {"mean": _mean(sizes),
+                                "max": max(sizes or [0])},
+            "deliveries": network.deliveries,
+            "cpu_ms_per_client_round": {"mean": _mean(cpu) * 1000,
+                                        "max": max(cpu or [0.0]) * 1000},
+            "mean_score": _mean(scores)}
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [options]",
+                                   description=__doc__.split("\n\n")[0])
+    parser.add_option("--players", "-n", type="int", default=10,
+                      help="virtual players (default %default)")
+    parser.add_option("--rounds", "-r", type="int", default=10,
+                      help="question rounds to simulate (default %default)")
+    parser.add_option("--period", type="int", default=10,
+                      help="seconds per question (default %default)")
+    parser.add_option("--latency", type="float", default=50.0,
+                      help="network latency in ms (default %default)")
+    parser.add_option("--jitter", type="float", default=20.0,
+                      help="extra random latency in ms (default %default)")
+    parser.add_option("--reorder", type="float", default=0.05,
+                      help="probability that a message is held back "
+                           "(default %default)")
+    parser.add_option("--reorder-delay", type="float", default=500.0,
+                      help="most a held back message waits, in ms "
+                           "(default %default)")
+    parser.add_option("--skew", type="float", default=0.2,
+                      help="largest clock error of a player in seconds "
+                           "(default %default)")
+    parser.add_option("--answer-rate", type="float", default=0.9,
+                      help="probability of answering a question "
+                           "(default %default)")
+    parser.add_option("--accuracy", type="float", default=0.8,
+                      help="probability that an answer is right "
+                           "(default %default)")
+    parser.add_option("--think-time", type="float", default=3.0,
+                      help="mean seconds before answering (default %default)")
+    parser.add_option("--seed", type="int", default=0,
+                      help="random seed (default %default)")
+    parser.add_option("--output", "-o",
+                      help="also write the report to this JSON file")
+    options, args = parser.parse_args(argv)
+    if args:
+        parser.error("unexpected arguments")
+
+    report = simulate(options)
+    print json.dumps(report, indent=1, sort_keys=True)
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(report, file, indent=1, sort_keys=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Puzzle collections kept in directories and zip bundles.
+
+A collection may contain an index file named "index" that lists its
+puzzles, one per line, as a file name optionally followed by the SHA-1 of
+the file's text:
+
+    # Times tables
+    multiplication.py 33779d9ef30be5019b76a348e2ca077efa07ec3a
+    division.py
+
+Only the listed files are used.  When the hash is given and the puzzle is
+already in the puzzle cache, the file does not have to be read at all.
+Without an index, every .py file of the collection is used, in name order.
+"""
+
+import os
+import os.path
+import zipfile
+import logging
+
+INDEX_NAME = "index"
+
+_logger = logging.getLogger('arithmetic-activity')
+
+class _DirectorySource(object):
+    def __init__(self, path):
+        self.path = path
+
+    def names(self):
+        return os.listdir(self.path)
+
+    def read(self, name):
+        with open(os.path.join(self.path, name), 'r') as file:
+            return file.read()
+
+class _ZipSource(object):
+    # The bundle is opened for each access, like the files of a
+    # directory, so that no file stays open for the whole session.
+    def __init__(self, path):
+        self.path = path
+
+    def names(self):
+        with zipfile.ZipFile(self.path) as bundle:
+            return bundle.namelist()
+
+    def read(self, name):
+        with zipfile.ZipFile(self.path) as bundle:
+            return bundle.read(name)
+
+class CatalogueEntry(object):
+    """One puzzle of a collection.  hash is None unless the index gave
+    it."""
+
+    def __init__(self, source, filename, hash=None):
+        self.source = source
+        self.filename = filename
+        self.hash = hash
+
+    def read(self):
+        return self.source.read(self.filename)
+
+class PuzzleCatalogue(object):
+    """An ordered list of puzzle collections."""
+
+    def __init__(self, paths=()):
+        self._sources = []
+        for path in paths:
+            self.add_path(path)
+
+    def add_path(self, path):
+        """Add a directory or a zip bundle.  Paths that are neither are
+        ignored, so optional locations may be added unconditionally."""
+        if os.path.isdir(path):
+            self._sources.append(_DirectorySource(path))
+        elif zipfile.is_zipfile(path):
+            self._sources.append(_ZipSource(path))
+
+    def entries(self):
+        """Generate a CatalogueEntry for each puzzle of each collection."""
+        for source in self._sources:
+            names = source.names()
+            if INDEX_NAME in names:
+                for entry in self._read_index(source):
+                    yield entry
+            else:
+                names = [name for name in names if name.endswith(".py")]
+                names.sort()
+                for name in names:
+                    yield CatalogueEntry(source, name)
+
+    def _read_index(self, source):
+        for line in source.read(INDEX_NAME).splitlines():
+            fields = line.split('#', 1)[0].split()
+            if len(fields) == 1:
+                yield CatalogueEntry(source, fields[0])
+            elif len(fields) == 2:
+                yield CatalogueEntry(source, fields[0], fields[1])
+            elif fields:
+                _logger.warning("Bad line in puzzle index of %s: %r",
+                                source.path, line)
+
+    def load(self, engine):
+        """Load every puzzle into a QuizEngine, reading only the files
+        whose compiled form is not in the engine's cache.  Returns the
+        hashes of the puzzles, in catalogue order, without duplicates."""
+        hashes = []
+        seen = set()
+        for entry in self.entries():
+            hash = entry.hash
+            if hash is None or not engine.add_cached_puzzle(hash):
+                text = entry.read()
+                engine.add_puzzle(text)
+                hash = engine.text_hash(text)
+            if hash is not None and hash not in seen:
+                seen.add(hash)
+                hashes.append(hash)
+        return hashes
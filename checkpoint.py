@@ -0,0 +1,101 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Compact snapshots of a session, so that late joiners can start from
+one message instead of the whole history."""
+
+import json
+import logging
+
+import gobject
+
+SNAPSHOT_VERSION = 1
+
+_logger = logging.getLogger('arithmetic-activity')
+
+def encode_snapshot(scores, puzzle_hashes):
+    """Encode packed scores (a dict from nickname to the tuple made by
+    score_codec) and the hashes of the session's puzzles as a string."""
+    return json.dumps({"version": SNAPSHOT_VERSION,
+                       "scores": scores,
+                       "puzzles": sorted(puzzle_hashes)},
+                      separators=(',', ':'))
+
+def decode_snapshot(text):
+    """Return (scores, puzzle_hashes) from encode_snapshot(), or None if
+    text is empty or not a snapshot this version understands."""
+    if not text:
+        return None
+    try:
+        snapshot = json.loads(text)
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return None
+        return snapshot["scores"], snapshot["puzzles"]
+    except (ValueError, KeyError, AttributeError):
+        _logger.warning("Ignoring a malformed session checkpoint")
+        return None
+
+class Checkpointer(object):
+    """Keeps a snapshot of the session in a shared HighScore.
+
+    The HighScore's value is the encoded snapshot and its score the time
+    it was taken, so the newest checkpoint wins everywhere.  A checkpoint
+    is written at most every interval seconds, and only if the scoreboard
+    changed since the newest checkpoint anybody wrote.  The first checkpoint
+    that arrives before we have written one ourselves is handed to
+    load(scores, puzzle_hashes)."""
+
+    def __init__(self, shared, clock, get_state, load, interval=30):
+        self._shared = shared
+        self._clock = clock
+        self._get_state = get_state
+        self._load = load
+        self._interval = interval
+        self._dirty = False
+        # Shared clock time of the latest change of the scoreboard
+        self._changed_at = None
+        self._loaded = False
+        self._source = None
+        shared.register_listener(self._checkpoint_cb)
+
+    def start(self):
+        if self._source is None:
+            self._source = gobject.timeout_add(int(self._interval * 1000),
+                                               self._interval_cb)
+
+    def stop(self):
+        if self._source is not None:
+            gobject.source_remove(self._source)
+            self._source = None
+
+    def mark_dirty(self):
+        self._dirty = True
+        self._changed_at = self._clock.time()
+
+    def _interval_cb(self):
+        if self._dirty:
+            self.write()
+        return True
+
+    def write(self):
+        scores, puzzle_hashes = self._get_state()
+        self._loaded = True
+        self._dirty = False
+        self._shared.set_value(encode_snapshot(scores, puzzle_hashes),
+                               self._clock.time())
+
+    def _checkpoint_cb(self, value, score):
+        # Somebody has just saved the state.  If they did so after our
+        # latest change, ours need not be saved until it changes again.
+        if self._dirty and score > self._changed_at:
+            self._dirty = False
+        if self._loaded:
+            return
+        snapshot = decode_snapshot(value)
+        if snapshot is not None:
+            self._loaded = True
+            self._load(*snapshot)
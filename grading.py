@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Answer grading for the Arithmetic activity.
+
+Answers are compared as exact fractions.  Learner input may be an integer
+of any size, a fraction ("3/4"), a mixed number ("1 1/2") or a decimal
+("0.75", ".75", "0,75"), with an optional sign; the Unicode minus sign
+and dashes count as a minus.  Commas that separate groups of three
+digits in a whole number ("5,040", "1,307,674,368,000") are thousands
+separators, not decimal points, and a leading zero before such a group
+("01,000") makes the answer malformed.  Nothing is ever passed to eval().
+
+Run as a script, it grades a recorded answer log offline:
+
+    python grading.py answers.csv > report.csv
+
+The log is a CSV file with a header.  It needs an "answer" column with
+the expected answers and a "response" column with what was typed; an
+optional "player" column groups the report, which gives the number of
+responses, the number correct and the accuracy for each player."""
+
+import re
+from fractions import Fraction
+
+_MINUS_SIGNS = (u'\u2212', u'\u2012', u'\u2013', u'\u2014', u'\ufe63', u'\uff0d')
+
+_NUMBER = re.compile(r"""
+    ^(?P<sign>[+-]?)\s*
+    (?:
+        (?P<whole>\d+)\s+(?P<mnum>\d+)\s*/\s*(?P<mden>\d+)   # 1 1/2
+      | (?P<num>\d+)\s*/\s*(?P<den>\d+)                     # 3/4
+      | (?P<grouped>[1-9]\d{0,2}(?:,\d{3})+)                 # 5,040
+      | (?P<int>\d*)(?P<point>[.,])(?P<frac>\d+)            # 0.75 .75 0,75
+      | (?P<digits>\d+)[.,]?                                # 12 12.
+    )$""", re.VERBOSE | re.UNICODE)
+
+def parse_answer(text):
+    """Parse learner input into a Fraction, or return None if it is not
+    a number."""
+    if isinstance(text, str):
+        text = text.decode('utf-8', 'replace')
+    text = text.strip()
+    # Plain integers are by far the most common answers.
+    try:
+        return Fraction(int(text))
+    except ValueError:
+        pass
+    for minus in _MINUS_SIGNS:
+        text = text.replace(minus, u'-')
+    match = _NUMBER.match(text)
+    if match is None:
+        return None
+    g = match.groupdict()
+    if g['digits'] is not None:
+        value = Fraction(int(g['digits']))
+    elif g['grouped'] is not None:
+        value = Fraction(int(g['grouped'].replace(',', '')))
+    elif g['frac'] is not None:
+        if g['point'] == ',' and len(g['frac']) == 3 and \
+                len(g['int']) > 1 and g['int'][0] == '0':
+            # Neither a decimal nor a group of thousands, as in "01,000".
+            return None
+        value = Fraction(int(g['int'] or 0)) + \
+                Fraction(int(g['frac']), 10 ** len(g['frac']))
+    elif g['num'] is not None:
+        if int(g['den']) == 0:
+            return None
+        value = Fraction(int(g['num']), int(g['den']))
+    else:
+        if int(g['mden']) == 0:
+            return None
+        value = int(g['whole']) + Fraction(int(g['mnum']), int(g['mden']))
+    if g['sign'] == '-':
+        value = -value
+    return value
+
+def normalize_answer(answer):
+    """Turn an expected answer, as returned by a puzzle, into a Fraction.
+    Done once per question, so that checking a response is a single
+    comparison.  Returns None for answers that are not numbers."""
+    if isinstance(answer, Fraction):
+        return answer
+    if isinstance(answer, (int, long)):
+        return Fraction(answer)
+    if isinstance(answer, float):
+        # repr() gives the decimal the puzzle author meant.
+        return parse_answer(repr(answer))
+    return parse_answer(unicode(answer))
+
+def is_correct(expected, response):
+    """expected is a normalized answer, response the learner's input."""
+    value = parse_answer(response)
+    return value is not None and value == expected
+
+class BatchGrader(object):
+    """Grades many (expected, response) pairs.  Both are usually strings
+    from a log, and the same values come up again and again, so parsed
+    values are memoized."""
+
+    def __init__(self):
+        self._expected = {}
+        self._responses = {}
+
+    def _parse(self, cache, text, parse):
+        try:
+            return cache[text]
+        except KeyError:
+            value = cache[text] = parse(text)
+            return value
+
+    def grade(self, expected, response):
+        expected = self._parse(self._expected, expected, normalize_answer)
+        if expected is None:
+            return False
+        return self._parse(self._responses, response, parse_answer) == expected
+
+    def grade_all(self, pairs):
+        """Generate True or False for each (expected, response) pair."""
+        grade = self.grade
+        for expected, response in pairs:
+            yield grade(expected, response)
+
+def grade_log(rows):
+    """Grade rows of a log (dicts with "answer", "response" and optionally
+    "player") and return {player: (responses, correct)}."""
+    grader = BatchGrader()
+    report = {}
+    for row in rows:
+        player = row.get("player", "")
+        responses, correct = report.get(player, (0, 0))
+        if grader.grade(row["answer"], row["response"]):
+            correct += 1
+        report[player] = (responses + 1, correct)
+    return report
+
+def main(argv=None):
+    import sys
+    import csv
+    import optparse
+
+    parser = optparse.OptionParser(usage="%prog [options] LOG.csv",
+                                   description=__doc__.split("\n\n")[0])
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("expected one answer log")
+
+    with open(args[0], "rb") as file:
+        reader = csv.DictReader(file)
+        if not reader.fieldnames or "answer" not in reader.fieldnames \
+                or "response" not in reader.fieldnames:
+            parser.error("the log needs \"answer\" and \"response\" columns")
+        report = grade_log(reader)
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(("player", "responses", "correct", "accuracy"))
+    for player in sorted(report):
+        responses, correct = report[player]
+        writer.writerow((player, responses, correct,
+                         "%.3f" % (float(correct) / responses)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""An append-only record of every answer given in a session.
+
+The journal is a binary file of fixed-size records after a short header,
+so appending an answer is a single write, and a reader can map the file
+and jump straight to any record.  A record that was only partly written
+when the activity crashed is ignored by the reader and overwritten by
+the next writer."""
+
+import os
+import mmap
+import struct
+from collections import namedtuple
+from fractions import Fraction
+
+from quizengine import DIFFICULTIES
+
+MAGIC = "ARJ1"
+_HEADER = struct.Struct("<4sI")
+# question index, answer numerator and denominator, latency, mode hash,
+# difficulty, correct, padding to a multiple of eight bytes.
+_RECORD = struct.Struct("<qqqd20sBB2x")
+
+RECORD_SIZE = _RECORD.size
+
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+JournalRecord = namedtuple("JournalRecord",
+                           "index mode difficulty answer correct latency")
+
+class JournalError(Exception):
+    """The file is not a journal this version understands."""
+    pass
+
+def _pack(index, mode, difficulty, answer, correct, latency):
+    # Answers that do not fit in 64 bits are stored as unknown (0/0).
+    numerator, denominator = 0, 0
+    if answer is not None:
+        answer = Fraction(answer)
+        if _INT64_MIN <= answer.numerator <= _INT64_MAX and \
+                answer.denominator <= _INT64_MAX:
+            numerator, denominator = answer.numerator, answer.denominator
+    return _RECORD.pack(index, numerator, denominator, latency,
+                        mode.decode("hex"), DIFFICULTIES.index(difficulty),
+                        bool(correct))
+
+def _unpack(buffer, offset):
+    index, numerator, denominator, latency, mode, difficulty, correct = \
+        _RECORD.unpack_from(buffer, offset)
+    if denominator:
+        answer = Fraction(numerator, denominator)
+    else:
+        answer = None
+    return JournalRecord(index, mode.encode("hex"), DIFFICULTIES[difficulty],
+                         answer, bool(correct), latency)
+
+def _check_header(data, path):
+    if len(data) < _HEADER.size:
+        raise JournalError("%s: truncated header" % path)
+    magic, size = _HEADER.unpack_from(data)
+    if magic != MAGIC or size != RECORD_SIZE:
+        raise JournalError("%s is not a session journal" % path)
+
+class JournalWriter(object):
+    """Appends answers to the journal at path, creating it if needed."""
+
+    def __init__(self, path):
+        self._file = open(path, "a+b")
+        self._file.seek(0, os.SEEK_END)
+        length = self._file.tell()
+        if length == 0:
+            self._file.write(_HEADER.pack(MAGIC, RECORD_SIZE))
+        else:
+            self._file.seek(0)
+            try:
+                _check_header(self._file.read(_HEADER.size), path)
+            except JournalError:
+                self._file.close()
+                raise
+            # Drop a record torn by a crash.
+            whole = length - (length - _HEADER.size) % RECORD_SIZE
+            if whole != length:
+                self._file.truncate(whole)
+        self._file.flush()
+
+    def append(self, index, mode, difficulty, answer, correct, latency):
+        """Record one answer.  mode is a puzzle hash, difficulty one of
+        DIFFICULTIES and answer a number, or None if it is not known."""
+        self._file.write(_pack(index, mode, difficulty, answer, correct,
+                               latency))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class JournalReader(object):
+    """Random access to the records of a journal through mmap.
+
+    Records appended after the reader was opened are not seen."""
+
+    def __init__(self, path):
+        self._map = None
+        self._count = 0
+        with open(path, "rb") as file:
+            length = os.fstat(file.fileno()).st_size
+            if length == 0:
+                return
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            _check_header(self._map, path)
+        except JournalError:
+            self.close()
+            raise
+        self._count = (length - _HEADER.size) // RECORD_SIZE
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("journal record out of range")
+        return _unpack(self._map, _HEADER.size + i * RECORD_SIZE)
+
+    def __iter__(self):
+        for offset in xrange(_HEADER.size,
+                             _HEADER.size + self._count * RECORD_SIZE,
+                             RECORD_SIZE):
+            yield _unpack(self._map, offset)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
@@ -0,0 +1,55 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Players ranked by total score."""
+
+import bisect
+
+class Leaderboard(object):
+    """Keeps every player ranked by cumulative score as scores change.
+
+    The ranking is a sorted list of (-cumulative_score, name) pairs, so an
+    update is a binary search plus a list insertion, and the top K players
+    are simply its first K entries.  Ties are broken by name, which keeps
+    the order the same for everyone."""
+
+    def __init__(self):
+        self._ranking = []
+        self._scores = {}
+
+    def update(self, name, cumulative_score):
+        """Record a player's total.  Returns True if the ranking changed."""
+        old = self._scores.get(name)
+        if old == cumulative_score:
+            return False
+        if old is not None:
+            del self._ranking[bisect.bisect_left(self._ranking, (-old, name))]
+        bisect.insort(self._ranking, (-cumulative_score, name))
+        self._scores[name] = cumulative_score
+        return True
+
+    def remove(self, name):
+        old = self._scores.pop(name, None)
+        if old is not None:
+            del self._ranking[bisect.bisect_left(self._ranking, (-old, name))]
+
+    def top(self, k):
+        """The names of the k best players, best first."""
+        return [name for score, name in self._ranking[:k]]
+
+    def rank(self, name):
+        """A player's position, counting from 1, or None if unknown."""
+        score = self._scores.get(name)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._ranking, (-score, name)) + 1
+
+    def __contains__(self, name):
+        return name in self._scores
+
+    def __len__(self):
+        return len(self._scores)
@@ -0,0 +1,138 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Opt-in instrumentation of the activity's callbacks.
+
+Set ARITHMETIC_PROFILE=1 in the environment (or the PROFILE option of the
+activity) to count the calls of the instrumented methods and time them.
+ARITHMETIC_PROFILE_SECONDS=N also runs cProfile over the first N seconds
+of the session, and ARITHMETIC_PROFILE_FILE=path writes the results to
+path (the cProfile data to path.prof) instead of the activity log.
+
+Methods are only wrapped when instrumentation is on, so when it is off
+they are called exactly as before.  When puzzles run in sandbox worker
+processes (the default), "get_problem" only counts puzzles run in the
+activity itself; the workers' jobs are timed as "puzzle_job", from
+sending a job to collecting its questions."""
+
+import os
+import logging
+from functools import wraps
+
+import gobject
+
+from timing import monotonic
+
+_logger = logging.getLogger('arithmetic-activity')
+
+class Instrumentation(object):
+    """Call counts, total and longest wall time of wrapped methods, and
+    an optional cProfile window."""
+
+    def __init__(self, enabled=False, profile_seconds=0, output=None):
+        self._enabled = enabled
+        self._profile_seconds = profile_seconds
+        self._output = output
+        self._profile = None
+        # label -> [calls, total seconds, longest call]
+        self._stats = {}
+
+    def from_environment(cls, enabled=False, profile_seconds=0, output=None,
+                         environ=os.environ):
+        """Instrumentation configured by the ARITHMETIC_PROFILE variables,
+        falling back on the given values where they are not set."""
+        value = environ.get("ARITHMETIC_PROFILE")
+        if value is not None:
+            enabled = value not in ("", "0")
+        try:
+            profile_seconds = float(environ["ARITHMETIC_PROFILE_SECONDS"])
+        except (KeyError, ValueError):
+            pass
+        output = environ.get("ARITHMETIC_PROFILE_FILE", output)
+        return cls(enabled, profile_seconds, output)
+
+    from_environment = classmethod(from_environment)
+
+    def _get_enabled(self):
+        return self._enabled
+
+    enabled = property(_get_enabled)
+
+    def wrap(self, obj, name, label=None):
+        """Replace the method obj.name with one that records its calls
+        under label (by default, name)."""
+        if not self._enabled:
+            return
+        method = getattr(obj, name)
+        label = label or name
+        record = self.record
+
+        @wraps(method)
+        def timed(*args, **kwargs):
+            started = monotonic()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                record(label, monotonic() - started)
+        setattr(obj, name, timed)
+
+    def record(self, label, elapsed):
+        """Record a call that took elapsed seconds under label."""
+        if not self._enabled:
+            return
+        entry = self._stats.setdefault(label, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+        if elapsed > entry[2]:
+            entry[2] = elapsed
+
+    def start(self):
+        """Start the cProfile window, if one was asked for."""
+        if not self._enabled or self._profile_seconds <= 0 or \
+                self._profile is not None:
+            return
+        import cProfile
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        gobject.timeout_add(int(self._profile_seconds * 1000),
+                            self._profile_done_cb)
+
+    def _profile_done_cb(self):
+        self._profile.disable()
+        if self._output:
+            self._profile.dump_stats(self._output + ".prof")
+        else:
+            import pstats
+            import StringIO
+            text = StringIO.StringIO()
+            stats = pstats.Stats(self._profile, stream=text)
+            stats.sort_stats("cumulative").print_stats(30)
+            _logger.info("cProfile of the first %g seconds:\n%s",
+                         self._profile_seconds, text.getvalue())
+        return False
+
+    def report(self):
+        """A table of the recorded calls, slowest in total first."""
+        lines = ["%-20s %8s %12s %12s %12s" %
+                 ("callback", "calls", "total ms", "mean ms", "max ms")]
+        rows = sorted(self._stats.iteritems(), key=lambda item: -item[1][1])
+        for label, (calls, total, longest) in rows:
+            mean = calls and total / calls
+            lines.append("%-20s %8d %12.3f %12.3f %12.3f" %
+                         (label, calls, total * 1000, mean * 1000,
+                          longest * 1000))
+        return "\n".join(lines)
+
+    def dump(self):
+        """Write the call report to the output file or the log."""
+        if not self._enabled:
+            return
+        if self._output:
+            with open(self._output, "w") as file:
+                file.write(self.report() + "\n")
+        else:
+            _logger.info("Callback timings:\n%s", self.report())
@@ -0,0 +1,62 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Batched publishing of the local player's score."""
+
+import gobject
+
+class ScorePublisher(object):
+    """Holds back the local player's score changes and writes them to the
+    shared scoreboard in one go.
+
+    Every write to the scoreboard CausalDict is a network message, so
+    instead of writing on every correct answer, changes are kept pending
+    until flush() is called -- by the activity once per question round --
+    or, if interval is given, at most interval seconds after the first
+    pending change.  Listeners registered with register_listener() are
+    told about every change at once, as listener(name, score), so the
+    local display never lags behind."""
+
+    def __init__(self, scoreboard, name, interval=None):
+        self._scoreboard = scoreboard
+        self._name = name
+        self._interval = interval
+        self._pending = None
+        self._source = None
+        self._listeners = []
+
+    def register_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _get_score(self):
+        if self._pending is not None:
+            return self._pending
+        return self._scoreboard[self._name]
+
+    score = property(_get_score)
+
+    def set_score(self, score):
+        self._pending = score
+        for listener in self._listeners:
+            listener(self._name, score)
+        if self._interval is not None and self._source is None:
+            self._source = gobject.timeout_add(int(self._interval * 1000),
+                                               self._interval_cb)
+
+    def _interval_cb(self):
+        self._source = None
+        self.flush()
+        return False
+
+    def flush(self):
+        """Publish the pending change, if any."""
+        if self._source is not None:
+            gobject.source_remove(self._source)
+            self._source = None
+        if self._pending is not None:
+            score, self._pending = self._pending, None
+            self._scoreboard[self._name] = score
@@ -0,0 +1,118 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""A content-addressed cache of compiled puzzles."""
+
+import os
+import os.path
+import imp
+import marshal
+import logging
+import tempfile
+
+_logger = logging.getLogger('arithmetic-activity')
+
+class PuzzleCache(object):
+    """Compiled puzzles, keyed by the SHA-1 of their text.
+
+    Each entry holds the puzzle's name, its sort_key and the code object
+    of the whole puzzle text, so a puzzle that was seen before can be
+    loaded without compiling it again.  Entries are kept in memory and,
+    if a directory is given, in one marshal file per puzzle.  Code objects
+    are only valid for the interpreter that made them, so files are kept
+    in a subdirectory named after the bytecode magic number.
+
+    The cache also keeps the tables that puzzles with a precompute() hook
+    build, so that the activity, its puzzle workers and the export tools
+    build each table only once."""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._memory = {}
+        self._tables = {}
+        if directory is not None:
+            directory = os.path.join(directory, imp.get_magic().encode("hex"))
+        self._directory = directory
+
+    def _path(self, hash):
+        return os.path.join(self._directory, hash + ".marshal")
+
+    def __contains__(self, hash):
+        if hash in self._memory:
+            return True
+        return self._directory is not None and os.path.exists(self._path(hash))
+
+    def get(self, hash):
+        """Return (name, sort_key, code) for hash, or None."""
+        entry = self._memory.get(hash)
+        if entry is not None or self._directory is None:
+            return entry
+        try:
+            with open(self._path(hash), 'rb') as file:
+                name, sort_key, code = marshal.load(file)
+        except (IOError, OSError):
+            return None
+        except (EOFError, ValueError, TypeError):
+            _logger.warning("Ignoring damaged puzzle cache entry %s", hash)
+            return None
+        entry = self._memory[hash] = (name, sort_key, code)
+        return entry
+
+    def put(self, hash, name, sort_key, code):
+        entry = self._memory[hash] = (name, sort_key, code)
+        if self._directory is not None:
+            self._write(self._path(hash), entry, hash)
+
+    def _write(self, path, value, hash):
+        try:
+            if not os.path.isdir(self._directory):
+                os.makedirs(self._directory)
+            # Write to a temporary file first, so that a reader never sees
+            # half an entry.
+            fd, tmppath = tempfile.mkstemp(dir=self._directory)
+            with os.fdopen(fd, 'wb') as file:
+                marshal.dump(value, file)
+            os.rename(tmppath, path)
+        except (IOError, OSError, ValueError), e:
+            _logger.warning("Could not cache puzzle %s: %s", hash, e)
+
+    def _table_path(self, hash, difficulty):
+        return os.path.join(self._directory,
+                            "%s.%s.table" % (hash, difficulty))
+
+    def get_table(self, hash, difficulty):
+        """Return the (digits, questions, answers) table of a puzzle for
+        difficulty, or None."""
+        key = (hash, difficulty)
+        table = self._tables.get(key)
+        if table is not None or self._directory is None:
+            return table
+        try:
+            with open(self._table_path(hash, difficulty), 'rb') as file:
+                table = marshal.load(file)
+        except (IOError, OSError):
+            return None
+        except (EOFError, ValueError, TypeError):
+            _logger.warning("Ignoring damaged puzzle table %s %s",
+                            hash, difficulty)
+            return None
+        self._tables[key] = table
+        return table
+
+    def put_table(self, hash, difficulty, table):
+        self._tables[(hash, difficulty)] = table
+        if self._directory is not None:
+            self._write(self._table_path(hash, difficulty), table, hash)
+
+    def hashes(self):
+        """Every hash in the cache."""
+        hashes = set(self._memory)
+        if self._directory is not None and os.path.isdir(self._directory):
+            for filename in os.listdir(self._directory):
+                if filename.endswith(".marshal"):
+                    hashes.add(filename[:-len(".marshal")])
+        return hashes
@@ -8,3 +8,8 @@ def get_problem(self, difficulty):
     question = "  %2d\n+ %2d" % (x, y)
     answer = x + y
     return question, answer
+
+def get_problems(self, difficulty, count):
+    x = self.generate_numbers(difficulty, count)
+    y = self.generate_numbers(difficulty, count)
+    return "  %2d\n+ %2d", (x, y), x + y
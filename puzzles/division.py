@@ -8,3 +8,16 @@ def get_problem(self, difficulty):
     question = "%s / %s" % (x*y, x)
     answer = y
     return question, answer
+
+def precompute(self, difficulty):
+    import math
+    rows = []
+    for x, n in self.operands(difficulty, 2):
+        y = int(math.ceil(n / 2))
+        rows.append(("%s / %s" % (x*y, x), y))
+    return rows
+
+def get_problems(self, difficulty, count):
+    x = self.generate_numbers(difficulty, count)
+    y = self.generate_numbers(difficulty, count) // 2
+    return "%s / %s", (x*y, x), y
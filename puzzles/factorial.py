@@ -7,3 +7,8 @@ def get_problem(self, difficulty):
     question = " %s!" % (x)
     answer = math.factorial(x)
     return question, answer
+
+def precompute(self, difficulty):
+    import math
+    return [(" %s!" % (x), math.factorial(x))
+            for x, in self.operands(difficulty, 1)]
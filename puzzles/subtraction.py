@@ -7,3 +7,8 @@ def get_problem(self, difficulty):
     question = "%s - %s" % (x, y)
     answer = x - y
     return question, answer
+
+def get_problems(self, difficulty, count):
+    x = self.generate_numbers(difficulty, count)
+    y = self.generate_numbers(difficulty, count)
+    return "%s - %s", (x, y), x - y
@@ -0,0 +1,718 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Question generation for the Arithmetic activity, free of any GTK or
+Sugar dependency so that it can also run on machines without a display."""
+
+import ast
+import math
+import bisect
+import hashlib
+import logging
+import itertools
+
+from puzzlecache import PuzzleCache
+
+_logger = logging.getLogger('arithmetic-activity')
+
+DIFFICULTIES = ("easy", "medium", "hard")
+DIFFICULTY_LIMITS = {"easy": 9, "medium": 19, "hard": 50}
+# The largest weight the tools accept; schedules grow with the weights.
+MAX_WEIGHT = 99
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN64 = 0x9E3779B97F4A7C15
+
+def _import_numpy():
+    """NumPy, or None if it is not installed.  Only bulk generation with
+    get_problems() needs it, so it is not imported with this module."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def puzzle_hash(text):
+    """Return the hex SHA-1 digest that identifies a puzzle text."""
+    md = hashlib.sha1()
+    md.update(text)
+    return md.digest().encode("hex")
+
+def puzzle_metadata(text):
+    """Return (name, sort_key) of a puzzle text without running it.  Both
+    must be assigned literals at the top level of the puzzle; ValueError
+    is raised otherwise."""
+    values = {}
+    try:
+        tree = ast.parse(text)
+    except SyntaxError, e:
+        raise ValueError("puzzle does not parse: %s" % e)
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and \
+                        target.id in ("name", "sort_key"):
+                    values[target.id] = ast.literal_eval(node.value)
+    if "name" not in values or "sort_key" not in values:
+        raise ValueError("puzzle has no literal name and sort_key")
+    return values["name"], values["sort_key"]
+
+def question_index_at(t0, period, now):
+    """The index of the question that is showing at time now, when
+    question N starts at t0 + period * N."""
+    return int(math.floor((now - t0) / float(period)))
+
+def next_boundary(t0, period, now):
+    """The time at which the question after the one showing at now
+    starts."""
+    return t0 + period * (question_index_at(t0, period, now) + 1)
+
+def _mix64(z):
+    """The SplitMix64 finalizer: a bijective scrambling of 64-bit integers."""
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+def session_seed(t0):
+    """Derive the 64-bit session seed from the shared startpoint.  repr()
+    of a float is the same on every Python version since 2.7, unlike
+    hash(), which random.seed() used to rely on."""
+    md = hashlib.sha1()
+    md.update(repr(float(t0)))
+    return int(md.hexdigest()[:16], 16)
+
+class QuestionRandom(object):
+    """A deterministic random stream for a single question.
+
+    The stream for question index of a session is addressed directly by
+    (seed, index), in the manner of a counter-based generator, so any
+    question can be produced without generating the ones before it and
+    without touching the global random module.  Puzzles receive it as the
+    first argument of get_problem()."""
+
+    def __init__(self, seed, index):
+        self._key = _mix64((seed + index * _GOLDEN64) & _MASK64)
+        self._counter = 0
+
+    def next64(self):
+        """Return the next 64 random bits as an integer."""
+        self._counter += 1
+        return _mix64((self._key + self._counter * _GOLDEN64) & _MASK64)
+
+    def random(self):
+        """Return a float in [0.0, 1.0)."""
+        return (self.next64() >> 11) * (1.0 / (1 << 53))
+
+    def randbelow(self, n):
+        """Return an integer in [0, n) without modulo bias."""
+        if n <= 0:
+            raise ValueError("randbelow() needs a positive bound")
+        limit = (_MASK64 + 1) - ((_MASK64 + 1) % n)
+        r = self.next64()
+        while r >= limit:
+            r = self.next64()
+        return int(r % n)
+
+    def randint(self, a, b):
+        """Return an integer in [a, b], like random.randint()."""
+        return a + self.randbelow(b - a + 1)
+
+    def choice(self, seq):
+        return seq[self.randbelow(len(seq))]
+
+    def generate_number(self, difficulty, lessthan=0):
+        try:
+            limit = DIFFICULTY_LIMITS[difficulty]
+        except KeyError:
+            raise AssertionError
+        return self.randint(1, lessthan or limit)
+
+class PermutedRandom(QuestionRandom):
+    """The random stream of a question whose operands are given.
+
+    The first digits calls of generate_number(difficulty) for the
+    difficulty whose limit is radix return the base-radix digits of
+    value, plus one, so that each value in range(radix ** digits) stands
+    for a different set of operands.  Other calls draw from the stream as
+    usual."""
+
+    def __init__(self, seed, index, value, radix, digits):
+        QuestionRandom.__init__(self, seed, index)
+        self.value = value
+        self.radix = radix
+        self.digits = digits
+        self._value = value
+        self._digits = digits
+
+    def generate_number(self, difficulty, lessthan=0):
+        if self._digits and not lessthan and \
+                DIFFICULTY_LIMITS.get(difficulty) == self.radix:
+            self._digits -= 1
+            self._value, digit = divmod(self._value, self.radix)
+            return digit + 1
+        return QuestionRandom.generate_number(self, difficulty, lessthan)
+
+class _CountingRandom(QuestionRandom):
+    """Counts a puzzle's generate_number() calls."""
+
+    def __init__(self):
+        QuestionRandom.__init__(self, 0, 0)
+        self.count = 0
+
+    def generate_number(self, difficulty, lessthan=0):
+        if not lessthan:
+            self.count += 1
+        return QuestionRandom.generate_number(self, difficulty, lessthan)
+
+class TableBuilder(object):
+    """What a puzzle's optional precompute() hook receives.
+
+    A puzzle may define precompute(self, difficulty) next to
+    get_problem().  It returns a (question, answer) pair for each operand
+    tuple of self.operands(difficulty, n), in that order, where n is the
+    number of times get_problem() calls generate_number().  The engine
+    then looks questions up in the table instead of calling get_problem().
+    For example:
+
+        def precompute(self, difficulty):
+            import math
+            return [(" %s!" % x, math.factorial(x))
+                    for x, in self.operands(difficulty, 1)]
+    """
+
+    def __init__(self):
+        self.digits = None
+
+    def operands(self, difficulty, count):
+        """Every count-tuple of numbers generate_number(difficulty) can
+        return, in the order that PermutedRandom numbers them."""
+        self.digits = count
+        numbers = range(1, DIFFICULTY_LIMITS[difficulty] + 1)
+        for reversed_tuple in itertools.product(numbers, repeat=count):
+            yield reversed_tuple[::-1]
+
+class ProblemTable(object):
+    """The distinct questions, and their answers, built by a puzzle's
+    precompute() hook.  When several operand tuples make the same
+    question, only the first is kept, so that a session can go through
+    every question once."""
+
+    def __init__(self, digits, questions, answers):
+        self.digits = digits
+        self.questions = []
+        self.answers = []
+        seen = set()
+        for question, answer in itertools.izip(questions, answers):
+            if question not in seen:
+                seen.add(question)
+                self.questions.append(question)
+                self.answers.append(answer)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __getitem__(self, i):
+        return self.questions[i], self.answers[i]
+
+    def pack(self):
+        """A tuple that marshal can store."""
+        return self.digits, self.questions, self.answers
+
+class KeyedPermutation(object):
+    """A pseudo-random permutation of range(size), chosen by key.
+
+    Any element can be looked up on its own, in constant memory: it is a
+    four-round Feistel network on the smallest even number of bits that
+    covers size, and values that fall outside range(size) are encrypted
+    again until they fall inside it (cycle-walking)."""
+
+    ROUNDS = 4
+
+    def __init__(self, size, key):
+        if size <= 0:
+            raise ValueError("a permutation needs a positive size")
+        self.size = size
+        bits = max(1, (size - 1).bit_length())
+        self._half = (bits + 1) // 2
+        self._mask = (1 << self._half) - 1
+        self._keys = [_mix64((key + (r + 1) * _GOLDEN64) & _MASK64)
+                      for r in xrange(self.ROUNDS)]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.size:
+            raise IndexError("permutation index out of range")
+        half, mask = self._half, self._mask
+        while True:
+            left, right = i >> half, i & mask
+            for key in self._keys:
+                left, right = right, left ^ (_mix64(key ^ right) & mask)
+            i = (left << half) | right
+            if i < self.size:
+                return int(i)
+
+def _gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+class QuestionSchedule(object):
+    """How often each (mode, difficulty) pair of a session comes up.
+
+    weights maps mode hashes and difficulty names to positive integer
+    weights (1 where missing); a pair's weight is the product of its
+    mode's and its difficulty's.  Questions come in blocks of size slots,
+    in which each pair has a number of slots proportional to its weight.
+    An alias table maps a slot to its pair and to the pair's count of
+    earlier slots in the block, in constant time however many pairs there
+    are.  Only integers are involved, so every client builds the same
+    table.  With equal weights a block has one slot per pair."""
+
+    def __init__(self, modelist, difficultylist, weights=None):
+        # modelist must be sorted and difficultylist in DIFFICULTIES order.
+        weights = weights or {}
+        self.modes = list(modelist)
+        self.difficulties = list(difficultylist)
+        counts = [weights.get(mode, 1) * weights.get(difficulty, 1)
+                  for mode in self.modes for difficulty in self.difficulties]
+        self.pairs = n = len(counts)
+        if n == 0:
+            self.size = 0
+            return
+        divisor = reduce(_gcd, counts)
+        counts = [count // divisor for count in counts]
+        total = sum(counts)
+        self.size = n * total // _gcd(n, total)
+        # Each of the n columns of the alias table covers height slots.
+        self._height = height = self.size // n
+        self.slots = [count * (self.size // total) for count in counts]
+
+        # Vose's alias method.  Column i holds prob[i] slots of pair i and
+        # the rest of its height for pair alias[i].
+        self._prob = prob = [height] * n
+        self._alias = alias = range(n)
+        left = list(self.slots)
+        small = [i for i in xrange(n) if left[i] < height]
+        large = [i for i in xrange(n) if left[i] >= height]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s], alias[s] = left[s], l
+            left[l] -= height - left[s]
+            if left[l] < height:
+                small.append(l)
+            else:
+                large.append(l)
+        # The count of pair alias[i]'s slots before column i's share.
+        self._offset = [0] * n
+        seen = list(prob)
+        for i in xrange(n):
+            if prob[i] < height:
+                self._offset[i] = seen[alias[i]]
+                seen[alias[i]] += height - prob[i]
+
+    def pair(self, i):
+        """The (mode, difficulty) of pair number i."""
+        mode, difficulty = divmod(i, len(self.difficulties))
+        return self.modes[mode], self.difficulties[difficulty]
+
+    def lookup(self, slot):
+        """Return (pair, rank): the pair that slot of a block belongs to,
+        and how many of the pair's slots come before it."""
+        column, row = divmod(slot, self._height)
+        prob = self._prob[column]
+        if row < prob:
+            return column, row
+        return self._alias[column], self._offset[column] + row - prob
+
+class BatchRandom(object):
+    """Random arrays for a puzzle's optional get_problems() entry point.
+
+    A puzzle may define get_problems(self, difficulty, count) next to
+    get_problem().  It receives a BatchRandom and returns a tuple
+    (template, operands, answers): a format string for the question, a
+    sequence of operand arrays to fill it with, and an array of answers.
+    For example:
+
+        def get_problems(self, difficulty, count):
+            x = self.generate_numbers(difficulty, count)
+            y = self.generate_numbers(difficulty, count)
+            return "%s x %s", (x, y), x * y
+    """
+
+    def __init__(self, seed):
+        import numpy
+        seed = _mix64(seed & _MASK64)
+        self.random_state = numpy.random.RandomState(
+            [seed & 0xFFFFFFFF, seed >> 32])
+
+    def randint(self, a, b, count):
+        """An array of count integers in [a, b]."""
+        return self.random_state.randint(a, b + 1, size=count)
+
+    def generate_numbers(self, difficulty, count, lessthan=0):
+        try:
+            limit = DIFFICULTY_LIMITS[difficulty]
+        except KeyError:
+            raise AssertionError
+        return self.randint(1, lessthan or limit, count)
+
+class ProblemBatch(object):
+    """The problems returned by get_problems().  Answers are computed for
+    the whole batch at once; the question strings are only formatted as
+    problems are looked at."""
+
+    def __init__(self, template, operands, answers):
+        self.template = template
+        import numpy
+        self.operands = [numpy.asarray(a) for a in operands]
+        self.answers = numpy.asarray(answers)
+
+    def __len__(self):
+        return len(self.answers)
+
+    def __getitem__(self, i):
+        row = tuple([int(a[i]) for a in self.operands])
+        return self.template % row, int(self.answers[i])
+
+    def __iter__(self):
+        template = self.template
+        rows = zip(*[a.tolist() for a in self.operands])
+        for row, answer in zip(rows, self.answers.tolist()):
+            yield template % row, answer
+
+class QuizEngine(object):
+    """Owns the puzzle registry, the shared seed and the question index.
+
+    The shared seed is normally the Groupthink HighScore kept in
+    cloud.startpoint, but any plain number may be used instead when the
+    engine runs headless.  Puzzles are compiled through a PuzzleCache;
+    pass one with a directory to keep compiled puzzles across sessions.
+
+    With execute=False, puzzle code is compiled but never run: only the
+    puzzles' names and sort keys are known, and questions have to be
+    generated elsewhere from puzzle_code(), as the PuzzleSandbox does."""
+
+    def __init__(self, startpoint=0.0, cache=None, execute=True):
+        self.startpoint = startpoint
+        self.question_index = 0
+        # Both kept sorted, so that every client indexes them alike.
+        self.active_modes = []
+        self.difficulties = []
+        # mode hash or difficulty -> weight, for weights other than 1
+        self.weights = {}
+        # The QuestionSchedule of the settings above, once it is needed.
+        self._schedule = None
+        if cache is None:
+            cache = PuzzleCache()
+        self.cache = cache
+        self.execute = execute
+        self._code = {}
+        self._puzzle_code = {}
+        self._text_hashes = {}
+        self._seed_cache = (None, None)
+        # (mode, difficulty) -> number of operands the puzzle draws
+        self._operand_counts = {}
+        # (mode, difficulty) -> ProblemTable, for puzzles that have them
+        self._tables = {}
+
+    def _get_t0(self):
+        try:
+            return self.startpoint.get_value()
+        except AttributeError:
+            return self.startpoint
+
+    t0 = property(_get_t0)
+
+    def _seed(self, t0):
+        cached_t0, seed = self._seed_cache
+        if cached_t0 != t0:
+            seed = session_seed(t0)
+            self._seed_cache = (t0, seed)
+        return seed
+
+    def question_random(self, t0, index):
+        """The random stream for question index of the session started at
+        t0."""
+        return QuestionRandom(self._seed(t0), index)
+
+    # Puzzle registry.
+    def add_puzzle(self, text):
+        """Load a puzzle text.  Returns its hash if it was not known yet,
+        and None if it was empty, already loaded or broken."""
+        hash = self.text_hash(text)
+        if hash is None or hash in self._puzzle_code:
+            return None
+
+        entry = self.cache.get(hash)
+        if entry is None:
+            # Puzzles come from other players, so anything may go wrong.
+            try:
+                code = compile(text, "<puzzle %s>" % hash, "exec")
+                if self.execute:
+                    env_local = self._run_puzzle(code)
+                    name, sort_key = env_local['name'], env_local['sort_key']
+                else:
+                    env_local = None
+                    name, sort_key = puzzle_metadata(text)
+            except Exception, e:
+                _logger.warning("Skipping puzzle %s: %s: %s", hash,
+                                type(e).__name__, e)
+                return None
+            self.cache.put(hash, name, sort_key, code)
+            self._load(hash, (name, sort_key, code), env_local)
+        else:
+            self._load(hash, entry)
+        return hash
+
+    def text_hash(self, text):
+        """The hash of a puzzle text, or None if the text is empty.  Each
+        text is hashed only once per session."""
+        hash = self._text_hashes.get(text)
+        if hash is None:
+            if text.strip() == '':
+                return None
+            hash = self._text_hashes[text] = puzzle_hash(text)
+        return hash
+
+    def add_cached_puzzle(self, hash):
+        """Load a puzzle from the cache by its hash alone.  Returns False
+        if the cache does not have it, so its text has to be fetched."""
+        if hash in self._puzzle_code:
+            return True
+        entry = self.cache.get(hash)
+        if entry is None:
+            return False
+        self._load(hash, entry)
+        return True
+
+    def load_code(self, hash, code):
+        """Load a compiled puzzle, as given by puzzle_code()."""
+        if hash not in self._puzzle_code:
+            env_local = self._run_puzzle(code)
+            self._load(hash, (env_local['name'], env_local['sort_key'], code),
+                       env_local)
+
+    def _load(self, hash, entry, env_local=None):
+        name, sort_key, code = entry
+        self._code[hash] = code
+        if not self.execute:
+            env_local = {'name': name, 'sort_key': sort_key}
+        elif env_local is None:
+            env_local = self._run_puzzle(code)
+        self._puzzle_code[hash] = env_local
+        if self.execute and 'precompute' in env_local:
+            for difficulty in DIFFICULTIES:
+                self._load_table(hash, env_local['precompute'], difficulty)
+
+    def _load_table(self, hash, precompute, difficulty):
+        packed = self.cache.get_table(hash, difficulty)
+        if packed is None:
+            builder = TableBuilder()
+            try:
+                rows = list(precompute(builder, difficulty))
+            except Exception, e:
+                _logger.warning("precompute() of puzzle %s failed: %s",
+                                hash, e)
+                return
+            if builder.digits is None or \
+                    len(rows) != DIFFICULTY_LIMITS[difficulty] ** builder.digits:
+                _logger.warning("precompute() of puzzle %s did not cover "
+                                "its operands", hash)
+                return
+            questions = [question for question, answer in rows]
+            answers = [answer for question, answer in rows]
+            table = ProblemTable(builder.digits, questions, answers)
+            self.cache.put_table(hash, difficulty, table.pack())
+        else:
+            table = ProblemTable(*packed)
+        self._tables[(hash, difficulty)] = table
+        self._operand_counts[(hash, difficulty)] = table.digits
+
+    def _run_puzzle(self, code):
+        env_global = {}
+        env_local = {}
+        exec code in env_global, env_local
+        return env_local
+
+    def get_puzzle(self, hash):
+        return self._puzzle_code[hash]
+
+    def puzzle_code(self, hash):
+        """The code object of a puzzle."""
+        return self._code[hash]
+
+    def has_puzzle(self, hash):
+        return hash in self._puzzle_code
+
+    def puzzle_hashes(self):
+        return self._puzzle_code.keys()
+
+    # Session settings.
+    def set_mode_active(self, hash, active):
+        modes = self.active_modes
+        i = bisect.bisect_left(modes, hash)
+        present = i < len(modes) and modes[i] == hash
+        if active and not present:
+            modes.insert(i, hash)
+        elif not active and present:
+            del modes[i]
+        else:
+            return
+        self._schedule = None
+
+    def set_difficulty_active(self, difficulty, active):
+        if difficulty not in DIFFICULTIES:
+            raise AssertionError
+        difficulties = set(self.difficulties)
+        if active:
+            difficulties.add(difficulty)
+        else:
+            difficulties.discard(difficulty)
+        self.difficulties = [d for d in DIFFICULTIES if d in difficulties]
+        self._schedule = None
+
+    def set_weight(self, key, weight):
+        """Make mode hash or difficulty key come up weight times as often
+        as one of weight 1.  weight must be a positive integer."""
+        if not isinstance(weight, (int, long)) or weight < 1:
+            raise ValueError("weights are positive integers")
+        if weight == 1:
+            self.weights.pop(key, None)
+        else:
+            self.weights[key] = weight
+        self._schedule = None
+
+    # Question generation.
+    def current_question(self):
+        """The question that belongs to the current question index, using
+        the active modes and difficulties.  See question()."""
+        if self._schedule is None:
+            # Rebuilt only after the settings change.
+            self._schedule = QuestionSchedule(self.active_modes,
+                                              self.difficulties, self.weights)
+        return self._question(self.t0, self.question_index, self._schedule)
+
+    def schedule(self, modes, difficulties, weights=None):
+        """The QuestionSchedule of the given settings."""
+        modelist = sorted(set(modes))
+        difficultylist = [d for d in DIFFICULTIES if d in difficulties]
+        return QuestionSchedule(modelist, difficultylist, weights)
+
+    def question(self, t0, index, modes, difficulties, weights=None):
+        """Return (mode, difficulty, question, answer) for question number
+        index of the session started at t0, or None if there is no active
+        mode or difficulty.  The result depends only on the arguments, so
+        every client computes the same question."""
+        return self._question(t0, index,
+                              self.schedule(modes, difficulties, weights))
+
+    def scheduled_question(self, t0, index, schedule):
+        """Like question(), with settings given by a QuestionSchedule from
+        schedule(), which can be kept for as long as they hold."""
+        return self._question(t0, index, schedule)
+
+    def _question(self, t0, index, schedule):
+        # Questions come in blocks in which every (mode, difficulty) pair
+        # has its share of slots, in an order shuffled per block.  The
+        # k-th question of a pair has element k of a permutation of all
+        # the operands the pair's puzzle can draw, so no operands repeat
+        # until they have all been used -- without remembering any of
+        # them.  Puzzles with a table are permuted over its distinct
+        # questions instead, as different operands can make the same
+        # question.
+        if schedule.pairs == 0:
+            return None
+        seed = self._seed(t0)
+        block, position = divmod(index, schedule.size)
+        slot = KeyedPermutation(schedule.size,
+                                _mix64(seed ^ (block & _MASK64)))[position]
+        pair, rank = schedule.lookup(slot)
+        mode, difficulty = schedule.pair(pair)
+        occurrence = block * schedule.slots[pair] + rank
+
+        table = self._tables.get((mode, difficulty))
+        if table is not None:
+            size = len(table)
+        else:
+            radix = DIFFICULTY_LIMITS[difficulty]
+            digits = self._operand_count(mode, difficulty)
+            size = radix ** digits
+        cycle, k = divmod(occurrence, size)
+        key = _mix64(seed ^ int(mode[:16], 16) ^
+                     ((cycle * len(DIFFICULTIES) +
+                       DIFFICULTIES.index(difficulty)) & _MASK64))
+        value = KeyedPermutation(size, key)[k]
+        if table is not None:
+            question, answer = table[value]
+        else:
+            rng = PermutedRandom(seed, index, value, radix, digits)
+            question, answer = self.generate_problem(mode, difficulty, rng)
+        return mode, difficulty, question, answer
+
+    def _operand_count(self, mode, difficulty):
+        """How many numbers the puzzle draws with generate_number(), found
+        by running it once."""
+        count = self._operand_counts.get((mode, difficulty))
+        if count is None:
+            rng = _CountingRandom()
+            self.generate_problem(mode, difficulty, rng)
+            count = self._operand_counts[(mode, difficulty)] = rng.count
+        return count
+
+    def questions(self, t0, start_index, count, modes=None, difficulties=None,
+                  weights=None):
+        """Generate count consecutive questions starting at start_index.
+        modes, difficulties and weights default to the engine's."""
+        if modes is None:
+            modes = self.active_modes
+        if difficulties is None:
+            difficulties = self.difficulties
+        if weights is None:
+            weights = self.weights
+        schedule = self.schedule(modes, difficulties, weights)
+        for index in xrange(start_index, start_index + count):
+            yield self._question(t0, index, schedule)
+
+    def generate_problem(self, mode, difficulty, rng):
+        """Run a puzzle.  Puzzles draw all their numbers from rng, usually
+        through rng.generate_number(difficulty)."""
+        if not self.execute:
+            raise ValueError("this engine does not run puzzles")
+        table = self._tables.get((mode, difficulty))
+        if table is not None:
+            return table[rng.randbelow(len(table))]
+        mode_dict = self._puzzle_code[mode]
+        get_problem = mode_dict['get_problem']
+        return get_problem(rng, difficulty)
+
+    def problems(self, mode, difficulty, count, seed=0):
+        """Return count (question, answer) pairs from one puzzle.
+
+        Puzzles with a get_problems() entry point produce the whole batch
+        from NumPy arrays, when NumPy is available.  Otherwise the pairs
+        are generated one by one with get_problem().  Either way the
+        result is determined by seed and the puzzle, so that puzzles
+        drawing numbers alike do not repeat each other's operands, but
+        the two paths do not give the same problems, and neither follows
+        the question order of a session; use questions() for that."""
+        if not self.execute:
+            raise ValueError("this engine does not run puzzles")
+        seed = _mix64((seed ^ int(mode[:16], 16)) & _MASK64)
+        mode_dict = self._puzzle_code[mode]
+        get_problems = mode_dict.get('get_problems')
+        if get_problems is not None and _import_numpy() is not None:
+            template, operands, answers = get_problems(BatchRandom(seed),
+                                                       difficulty, count)
+            return ProblemBatch(template, operands, answers)
+        return self._scalar_problems(mode, difficulty, count, seed)
+
+    def _scalar_problems(self, mode, difficulty, count, seed):
+        for i in xrange(count):
+            yield self.generate_problem(mode, difficulty,
+                                        QuestionRandom(seed, i))
@@ -0,0 +1,413 @@
+#!/usr/bin/env python
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""A headless quiz server with many rooms.
+
+Each room is a session of its own, with a startpoint, a period, puzzles
+and difficulties.  As in the activity, question N of a room is the one
+due at startpoint + period * N, and it follows from those settings alone,
+so a room costs the server next to nothing between question boundaries.
+The boundaries of all rooms are kept on one timer wheel.
+
+    python quizserver.py --port 5555 --puzzles puzzles
+
+Clients speak JSON, one object per line.  A client joins one room:
+
+    {"op": "join", "room": "3b", "player": "ana",
+     "period": 10, "modes": ["+", "x"], "difficulties": ["easy"],
+     "weights": {"x": 3}}
+
+The settings are only used by the first player, who creates the room;
+modes may be puzzle names or hashes.  Weights are positive integers, as
+in the activity, and default to 1.  The server answers with "joined",
+then sends a "question" at every boundary and a "scores" message with the
+room's scoreboard once per round, if it changed.  Answers are sent as
+
+    {"op": "answer", "answer": "12"}
+
+and are answered with "result".  {"op": "scores"} asks for the
+scoreboard at once, and {"op": "leave"} leaves the room."""
+
+import math
+import time
+import json
+import socket
+import asyncore
+import asynchat
+import logging
+import optparse
+
+import grading
+from quizengine import QuizEngine, DIFFICULTIES, MAX_WEIGHT, \
+    question_index_at, next_boundary
+from catalogue import PuzzleCatalogue
+
+_logger = logging.getLogger('arithmetic-activity')
+
+MAX_LINE = 4096
+# How far a room's startpoint may be from the server's clock, in seconds.
+MAX_STARTPOINT_OFFSET = 366 * 24 * 3600
+REQUESTS = ("join", "answer", "scores", "leave")
+
+def _string_list(message, key):
+    """message[key] if it is a list of strings, [] if it is missing."""
+    value = message.get(key) or []
+    if not isinstance(value, list) or \
+            not all(isinstance(item, basestring) for item in value):
+        raise ValueError("%s must be a list of strings" % key)
+    return value
+
+class TimerWheel(object):
+    """A hashed timer wheel: scheduling and firing are O(1) however many
+    timers are set, at the price of firing up to one tick late."""
+
+    def __init__(self, tick=0.05, slots=1024, now=0.0):
+        self._tick = tick
+        self._slots = [[] for i in xrange(slots)]
+        # The last tick that has been fired.
+        self._current = int(now // tick)
+
+    def schedule(self, when, item):
+        # Rounded up, so that an item never fires before its time.
+        tick = max(int(math.ceil(when / self._tick)), self._current + 1)
+        self._slots[tick % len(self._slots)].append((tick, item))
+
+    def advance(self, now):
+        """Return the items that have fallen due by now."""
+        target = int(now // self._tick)
+        steps = min(target - self._current, len(self._slots))
+        due = []
+        for i in xrange(self._current + 1, self._current + 1 + steps):
+            slot = self._slots[i % len(self._slots)]
+            if not slot:
+                continue
+            keep = []
+            for entry in slot:
+                if entry[0] <= target:
+                    due.append(entry[1])
+                else:
+                    keep.append(entry)
+            slot[:] = keep
+        self._current = max(self._current, target)
+        return due
+
+class Room(object):
+    """One session: its settings, its players and its scoreboard.
+
+    Scores are (cumulative_score, last_score, last_time) tuples, as in
+    the activity's ImmutableScore."""
+
+    def __init__(self, name, engine, startpoint, period, modes, difficulties,
+                 weights=None):
+        self.name = name
+        self.startpoint = startpoint
+        self.period = period
+        self.modes = sorted(set(modes))
+        self.difficulties = [d for d in DIFFICULTIES if d in difficulties]
+        self.weights = weights or {}
+        # The settings never change, so their schedule is built once.
+        self.schedule = engine.schedule(self.modes, self.difficulties,
+                                        self.weights)
+        self.clients = set()
+        self.scores = {}
+        self.closed = False
+        self._engine = engine
+        self._changed = False
+        self.index = None
+        self.question = None
+        self._expected = None
+        self._asked_at = None
+        self._answered = set()
+
+    def next_boundary(self, now):
+        return next_boundary(self.startpoint, self.period, now)
+
+    def start_question(self, now):
+        """Move to the question showing at now, and return it as
+        (mode, difficulty, question, answer), or None."""
+        self.index = question_index_at(self.startpoint, self.period, now)
+        self.question = self._engine.scheduled_question(
+            self.startpoint, self.index, self.schedule)
+        if self.question is not None:
+            self._expected = grading.normalize_answer(self.question[3])
+        else:
+            self._expected = None
+        self._asked_at = now
+        self._answered = set()
+        return self.question
+
+    def answer(self, player, text, now):
+        """Grade player's answer to the current question.  Returns
+        (correct, latency), or None if the player has already answered
+        or there is no question."""
+        if self._expected is None or player in self._answered:
+            return None
+        self._answered.add(player)
+        latency = now - self._asked_at
+        correct = grading.is_correct(self._expected, text)
+        if correct:
+            cumulative = self.scores.get(player, (0, 0, 0.0))[0]
+            self.scores[player] = (cumulative + 1, 1, latency)
+            self._changed = True
+        return correct, latency
+
+    def add_player(self, player):
+        if player not in self.scores:
+            self.scores[player] = (0, 0, 0.0)
+            self._changed = True
+
+    def take_changes(self):
+        """Whether the scoreboard changed since the last call."""
+        changed, self._changed = self._changed, False
+        return changed
+
+class QuizConnection(asynchat.async_chat):
+    """One client, speaking JSON lines."""
+
+    def __init__(self, sock, server):
+        asynchat.async_chat.__init__(self, sock, map=server.map)
+        self.set_terminator("\n")
+        self._server = server
+        self._buffer = []
+        self._length = 0
+        self.room = None
+        self.player = None
+
+    def collect_incoming_data(self, data):
+        self._length += len(data)
+        if self._length > MAX_LINE:
+            self.send_message({"op": "error", "message": "line too long"})
+            self.close_when_done()
+            return
+        self._buffer.append(data)
+
+    def found_terminator(self):
+        line = "".join(self._buffer)
+        self._buffer = []
+        self._length = 0
+        if not line.strip():
+            return
+        try:
+            message = json.loads(line)
+            op = message["op"]
+        except (ValueError, KeyError, TypeError):
+            self.send_message({"op": "error", "message": "not a request"})
+            return
+        if op not in REQUESTS:
+            self.send_message({"op": "error",
+                               "message": "unknown op %r" % op})
+            return
+        try:
+            getattr(self._server, "request_" + op)(self, message)
+        except (ValueError, KeyError, TypeError, OverflowError), e:
+            self.send_message({"op": "error", "message": str(e)})
+
+    def send_message(self, message):
+        self.push(json.dumps(message, separators=(',', ':')) + "\n")
+
+    def handle_close(self):
+        self._server.leave(self)
+        self.close()
+
+class QuizServer(asyncore.dispatcher):
+    """Listens for clients and runs their rooms.
+
+    The puzzles of engine are shared by all rooms.  clock gives the
+    current time; startpoints are on the same scale."""
+
+    def __init__(self, engine, host="127.0.0.1", port=5555, tick=0.05,
+                 clock=time.time):
+        self.map = {}
+        asyncore.dispatcher.__init__(self, map=self.map)
+        self.engine = engine
+        self.clock = clock
+        self.rooms = {}
+        self._tick = tick
+        self._wheel = TimerWheel(tick, now=clock())
+        self._names = dict((engine.get_puzzle(h)['name'], h)
+                           for h in engine.puzzle_hashes())
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(128)
+
+    def _get_address(self):
+        return self.socket.getsockname()
+
+    address = property(_get_address)
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            QuizConnection(pair[0], self)
+
+    # Requests.
+    def request_join(self, conn, message):
+        if conn.room is not None:
+            self.leave(conn)
+        name = unicode(message["room"])
+        player = unicode(message["player"])
+        room = self.rooms.get(name)
+        if room is None:
+            room = self._create_room(name, message)
+        if any(c.player == player for c in room.clients):
+            raise ValueError("%s is already in room %s" % (player, name))
+        conn.room, conn.player = room, player
+        room.clients.add(conn)
+        room.add_player(player)
+        conn.send_message({"op": "joined", "room": name,
+                           "startpoint": room.startpoint,
+                           "period": room.period,
+                           "modes": [self.engine.get_puzzle(h)['name']
+                                     for h in room.modes],
+                           "difficulties": room.difficulties})
+        if room.question is not None:
+            conn.send_message(self._question_message(room))
+
+    def _create_room(self, name, message):
+        now = self.clock()
+        period = float(message.get("period", 10))
+        if not 1 <= period <= 3600:
+            raise ValueError("period out of range")
+        modes = []
+        for mode in _string_list(message, "modes") or sorted(self._names):
+            mode = self._names.get(mode, mode)
+            if not self.engine.has_puzzle(mode):
+                raise ValueError("unknown puzzle %r" % mode)
+            modes.append(mode)
+        difficulties = _string_list(message, "difficulties") or ["easy"]
+        for difficulty in difficulties:
+            if difficulty not in DIFFICULTIES:
+                raise ValueError("unknown difficulty %r" % difficulty)
+        given = message.get("weights") or {}
+        if not isinstance(given, dict):
+            raise ValueError("weights must be an object")
+        weights = {}
+        for key, weight in given.iteritems():
+            key = self._names.get(key, key)
+            if not (self.engine.has_puzzle(key) or key in DIFFICULTIES):
+                raise ValueError("unknown weight %r" % key)
+            if isinstance(weight, bool) or \
+                    not isinstance(weight, (int, long)) or \
+                    not 1 <= weight <= MAX_WEIGHT:
+                raise ValueError("weights are integers from 1 to %d"
+                                 % MAX_WEIGHT)
+            if weight != 1:
+                weights[key] = weight
+        startpoint = float(message.get("startpoint", now))
+        # Also false for NaN and infinities, which json accepts.
+        if not abs(startpoint - now) <= MAX_STARTPOINT_OFFSET:
+            raise ValueError("startpoint out of range")
+        room = Room(name, self.engine, startpoint, period, modes,
+                    difficulties, weights)
+        room.start_question(now)
+        self._wheel.schedule(room.next_boundary(now), room)
+        # Only a room that has started is kept.
+        self.rooms[name] = room
+        return room
+
+    def request_answer(self, conn, message):
+        if conn.room is None:
+            raise ValueError("join a room first")
+        room = conn.room
+        result = room.answer(conn.player, unicode(message["answer"]),
+                             self.clock())
+        if result is None:
+            raise ValueError("no question to answer")
+        correct, latency = result
+        conn.send_message({"op": "result", "index": room.index,
+                           "correct": correct, "latency": latency,
+                           "score": room.scores[conn.player]})
+
+    def request_scores(self, conn, message):
+        if conn.room is None:
+            raise ValueError("join a room first")
+        conn.send_message(self._scores_message(conn.room))
+
+    def request_leave(self, conn, message):
+        self.leave(conn)
+
+    def leave(self, conn):
+        room = conn.room
+        if room is None:
+            return
+        room.clients.discard(conn)
+        conn.room = None
+        if not room.clients:
+            # The room's timer is dropped when it next fires.
+            room.closed = True
+            del self.rooms[room.name]
+
+    # Question boundaries.
+    def _question_message(self, room):
+        mode, difficulty, question, answer = room.question
+        return {"op": "question", "index": room.index,
+                "puzzle": self.engine.get_puzzle(mode)['name'],
+                "difficulty": difficulty, "question": question,
+                "deadline": room.next_boundary(self.clock())}
+
+    def _scores_message(self, room):
+        return {"op": "scores", "room": room.name, "index": room.index,
+                "scores": room.scores}
+
+    def _broadcast(self, room, message):
+        for conn in room.clients:
+            conn.send_message(message)
+
+    def run_timers(self):
+        now = self.clock()
+        for room in self._wheel.advance(now):
+            if room.closed:
+                continue
+            if room.take_changes():
+                self._broadcast(room, self._scores_message(room))
+            if room.start_question(now) is not None:
+                self._broadcast(room, self._question_message(room))
+            self._wheel.schedule(room.next_boundary(now), room)
+
+    def run_once(self):
+        # poll() rather than select(), which cannot wait for more than
+        # about a thousand sockets.
+        asyncore.loop(self._tick, use_poll=True, map=self.map, count=1)
+        self.run_timers()
+
+    def serve_forever(self):
+        while True:
+            self.run_once()
+
+    def close_all(self):
+        for dispatcher in self.map.values():
+            dispatcher.close()
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [options]",
+                                   description=__doc__.split("\n\n")[0])
+    parser.add_option("--host", default="127.0.0.1",
+                      help="address to listen on (default %default)")
+    parser.add_option("--port", "-p", type="int", default=5555,
+                      help="port to listen on (default %default)")
+    parser.add_option("--puzzles", action="append", default=[],
+                      help="puzzle directory or bundle; may be repeated "
+                           "(default: the bundled puzzles)")
+    options, args = parser.parse_args(argv)
+    if args:
+        parser.error("unexpected arguments")
+
+    logging.basicConfig(level=logging.INFO)
+    engine = QuizEngine()
+    PuzzleCatalogue(options.puzzles or ["puzzles"]).load(engine)
+    server = QuizServer(engine, options.host, options.port)
+    _logger.info("Serving %d puzzles on %s:%d", len(engine.puzzle_hashes()),
+                 *server.address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close_all()
+
+if __name__ == "__main__":
+    main()
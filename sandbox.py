@@ -0,0 +1,313 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Running puzzle code in worker processes.
+
+Puzzles arrive from other players, so their code is not run in the
+activity's own process.  A PuzzleSandbox keeps a few worker processes
+with limits on their memory and processor time, hands them the compiled
+puzzles, and kills and replaces a worker that takes longer than the
+timeout.  Nothing here blocks: jobs are submitted, and poll() collects
+the results that are ready.  A QuestionPrefetcher uses it to have the
+next questions computed before they are due."""
+
+import marshal
+import logging
+import multiprocessing
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from quizengine import QuizEngine
+from puzzlecache import PuzzleCache
+from timing import monotonic
+
+_logger = logging.getLogger('arithmetic-activity')
+
+# What QuestionPrefetcher.get() returns for a question whose job failed.
+FAILED = "failed"
+
+def _address_space():
+    """The size of this process's address space in bytes, or 0 if it
+    cannot be found out."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmSize:"):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    return 0
+
+def _limit_resources(memory_limit, cpu_limit):
+    if resource is None:
+        return
+    # Workers start as copies of the activity, however big it is, so
+    # memory_limit is what they may use on top of that.
+    if memory_limit:
+        memory_limit += _address_space()
+    for limit, value in ((resource.RLIMIT_AS, memory_limit),
+                         (resource.RLIMIT_CPU, cpu_limit)):
+        if value:
+            try:
+                resource.setrlimit(limit, (value, value))
+            except (ValueError, resource.error), e:
+                _logger.warning("Could not limit puzzle workers: %s", e)
+
+def _worker_main(conn, memory_limit, cpu_limit, cache_directory):
+    _limit_resources(memory_limit, cpu_limit)
+    # Puzzle tables are shared with the other workers through the cache.
+    engine = QuizEngine(cache=PuzzleCache(cache_directory))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        job, codes, t0, start, count, modes, difficulties, weights = message
+        try:
+            for hash, data in codes:
+                engine.load_code(hash, marshal.loads(data))
+            results = list(engine.questions(t0, start, count, modes,
+                                            difficulties, weights))
+            conn.send((job, results, None))
+        except Exception, e:
+            conn.send((job, None, "%s: %s" % (type(e).__name__, e)))
+
+class _Worker(object):
+    """One worker process, and the puzzles it has been sent."""
+
+    def __init__(self, memory_limit, cpu_limit, cache_directory):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit, cpu_limit, cache_directory))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.known = set()
+        # (job, callback, wanted, deadline, time sent) while busy
+        self.job = None
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join(1.0)
+        self.conn.close()
+
+class PuzzleSandbox(object):
+    """Generates questions with the puzzles of engine, which need not run
+    them itself (see QuizEngine's execute), in worker processes.
+
+    Each job gets timeout seconds, plus load_timeout seconds if it brings
+    puzzles the worker has not loaded yet, since loading runs their
+    precompute() hooks.  A worker that runs over is killed and replaced,
+    and the job fails.  Workers may use memory_limit bytes of
+    address space beyond what they had when they started, and cpu_limit
+    seconds of processor time in all, after which they are replaced too.
+
+    If given, record(label, seconds) is called with the time each job
+    took, from sending it to collecting its results, under the label
+    "puzzle_job"."""
+
+    def __init__(self, engine, workers=1, timeout=2.0,
+                 memory_limit=256 << 20, cpu_limit=600, record=None,
+                 load_timeout=30.0):
+        self._engine = engine
+        self._timeout = timeout
+        self._load_timeout = load_timeout
+        self._record = record
+        self._memory_limit = memory_limit
+        self._cpu_limit = cpu_limit
+        self._workers = [self._start_worker() for i in xrange(workers)]
+        # (job, request, callback, wanted) not yet sent to a worker
+        self._queue = []
+        self._jobs = 0
+
+    def _start_worker(self):
+        return _Worker(self._memory_limit, self._cpu_limit,
+                       self._engine.cache.directory)
+
+    def submit(self, t0, start, count, modes, difficulties, weights,
+               callback, wanted=None):
+        """Generate count questions from start, as engine.questions()
+        would.  callback(results) is called from poll() with the list of
+        questions, or with None if the job failed.
+
+        If given, wanted() tells whether the results are still needed.
+        A job that is no longer wanted is dropped, or its worker stopped,
+        without calling callback."""
+        self._jobs += 1
+        self._queue.append((self._jobs, (t0, start, count, list(modes),
+                                         list(difficulties), dict(weights)),
+                            callback, wanted))
+        self.poll()
+
+    def _get_busy(self):
+        return bool(self._queue) or \
+            any(worker.job is not None for worker in self._workers)
+
+    busy = property(_get_busy)
+
+    def poll(self):
+        """Collect finished jobs and start queued ones.  Returns whether
+        any job is still waiting, so it can serve as a timeout callback."""
+        now = monotonic()
+        for i, worker in enumerate(self._workers):
+            if worker.job is None:
+                continue
+            job, callback, wanted, deadline, sent = worker.job
+            try:
+                ready = worker.conn.poll()
+                if ready:
+                    done, results, error = worker.conn.recv()
+            except (EOFError, IOError):
+                ready, results, error = True, None, "the worker died"
+                self._workers[i] = worker = self._replace(worker)
+            if ready:
+                worker.job = None
+                if error is not None:
+                    _logger.warning("Puzzle failed: %s", error)
+                self._job_done(now - sent)
+                callback(results)
+            elif wanted is not None and not wanted():
+                # Nobody waits for it, so don't let it run to the timeout.
+                self._workers[i] = self._replace(worker)
+            elif now > deadline:
+                _logger.warning("Puzzle took longer than %g s; restarting "
+                                "its worker", deadline - sent)
+                self._workers[i] = self._replace(worker)
+                self._job_done(now - sent)
+                callback(None)
+        self._queue = [entry for entry in self._queue
+                       if entry[3] is None or entry[3]()]
+        for worker in self._workers:
+            if worker.job is None and self._queue:
+                self._send(worker, *self._queue.pop(0))
+        return self.busy
+
+    def _job_done(self, elapsed):
+        if self._record is not None:
+            self._record("puzzle_job", elapsed)
+
+    def _replace(self, worker):
+        worker.kill()
+        return self._start_worker()
+
+    def _send(self, worker, job, request, callback, wanted):
+        modes = request[3]
+        codes = []
+        for hash in modes:
+            if hash not in worker.known:
+                codes.append((hash,
+                              marshal.dumps(self._engine.puzzle_code(hash))))
+                worker.known.add(hash)
+        try:
+            worker.conn.send((job, codes) + request)
+        except (IOError, OSError), e:
+            _logger.warning("Could not reach a puzzle worker: %s", e)
+            self._workers[self._workers.index(worker)] = self._replace(worker)
+            callback(None)
+            return
+        sent = monotonic()
+        deadline = sent + self._timeout
+        if codes:
+            deadline += self._load_timeout
+        worker.job = (job, callback, wanted, deadline, sent)
+
+    def close(self):
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except IOError:
+                pass
+            worker.kill()
+        self._workers = []
+        self._queue = []
+
+class QuestionPrefetcher(object):
+    """Questions computed ahead in a PuzzleSandbox.
+
+    prefetch(index) asks for the questions index to index + ahead with
+    the engine's current startpoint, modes, difficulties and weights;
+    get(index) returns one if it has arrived.  Questions for other
+    settings are dropped when the settings change."""
+
+    FAILED = FAILED
+
+    def __init__(self, engine, sandbox, ahead=3, ready=None):
+        self._engine = engine
+        self._sandbox = sandbox
+        self._ahead = ahead
+        # Called as ready(index) when a question arrives.
+        self._ready = ready
+        self._settings = None
+        # Counts the changes of settings, to tell stale jobs apart.
+        self._generation = 0
+        # index -> question, or FAILED if it could not be generated
+        self._questions = {}
+        self._pending = set()
+
+    def _current_settings(self):
+        engine = self._engine
+        return (engine.t0, tuple(engine.active_modes),
+                tuple(engine.difficulties),
+                tuple(sorted(engine.weights.items())))
+
+    def _check_settings(self):
+        settings = self._current_settings()
+        if settings != self._settings:
+            self._settings = settings
+            self._generation += 1
+            self._questions.clear()
+            self._pending.clear()
+        return settings
+
+    def prefetch(self, index):
+        t0, modes, difficulties, weights = self._check_settings()
+        for old in [i for i in self._questions if i < index]:
+            del self._questions[old]
+        missing = [i for i in xrange(index, index + self._ahead + 1)
+                   if i not in self._questions and i not in self._pending]
+        if not missing or not modes or not difficulties:
+            return
+        start, count = missing[0], missing[-1] - missing[0] + 1
+        self._pending.update(xrange(start, start + count))
+        generation = self._generation
+
+        def wanted():
+            self._check_settings()
+            return self._generation == generation
+
+        def done(results):
+            if not wanted():
+                return
+            for i in xrange(start, start + count):
+                self._pending.discard(i)
+                if results is None:
+                    self._questions[i] = FAILED
+                else:
+                    self._questions[i] = results[i - start]
+                if self._ready is not None:
+                    self._ready(i)
+        self._sandbox.submit(t0, start, count, modes, difficulties,
+                             dict(weights), done, wanted)
+
+    def get(self, index):
+        """Return (True, question) once question index is known, where
+        question is as from QuizEngine.current_question() or FAILED if
+        its job failed, and (False, None) while it is still being
+        computed."""
+        t0, modes, difficulties, weights = self._check_settings()
+        if not modes or not difficulties:
+            return True, None
+        if index in self._questions:
+            return True, self._questions[index]
+        self.prefetch(index)
+        return False, None
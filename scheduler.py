@@ -0,0 +1,116 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Timers that follow the shared question clock."""
+
+import math
+import gobject
+
+from quizengine import question_index_at, next_boundary
+
+def _msec(seconds):
+    return max(0, int(math.ceil(seconds * 1000)))
+
+class QuestionScheduler(object):
+    """Calls callback(index) whenever a new question is due.
+
+    Instead of polling, the scheduler computes the next question boundary
+    from the startpoint and the period and arms a single timer for it.
+    reschedule() must be called when the startpoint or the period changes;
+    it reports the question at once if the change moved the index, and
+    replaces the pending timer, so there is never more than one."""
+
+    def __init__(self, clock, get_t0, get_period, callback):
+        self._clock = clock
+        self._get_t0 = get_t0
+        self._get_period = get_period
+        self._callback = callback
+        self._source = None
+        self._index = None
+        self._running = False
+
+    def start(self, index):
+        """Start waiting for the question after index."""
+        self._index = index
+        self._running = True
+        self.reschedule()
+
+    def stop(self):
+        self._running = False
+        if self._source is not None:
+            gobject.source_remove(self._source)
+            self._source = None
+
+    def reschedule(self):
+        if self._running:
+            self._check()
+            self._arm()
+
+    def _arm(self):
+        if self._source is not None:
+            gobject.source_remove(self._source)
+        t0 = self._get_t0()
+        period = self._get_period()
+        now = self._clock.time()
+        delay = _msec(next_boundary(t0, period, now) - now)
+        self._source = gobject.timeout_add(delay, self._boundary_cb)
+
+    def _boundary_cb(self):
+        # This source is finished once we return False, so forget it
+        # before _arm() would try to remove it.
+        self._source = None
+        # The clock may have been adjusted since the timer was armed, so
+        # only report a question if the index really moved.  Otherwise
+        # we simply wait for the (recomputed) boundary.
+        self._check()
+        if self._running:
+            self._arm()
+        return False
+
+    def _check(self):
+        index = question_index_at(self._get_t0(), self._get_period(),
+                                  self._clock.time())
+        if index != self._index:
+            self._index = index
+            self._callback(index)
+
+class CountdownTicker(object):
+    """Optionally shows the seconds left until the next question.
+
+    The ticker only formats a label.  It wakes up when the displayed
+    number of seconds changes, and question changes never depend on it."""
+
+    def __init__(self, clock, get_t0, get_period, label):
+        self._clock = clock
+        self._get_t0 = get_t0
+        self._get_period = get_period
+        self._label = label
+        self._source = None
+        self._shown = None
+
+    def start(self):
+        self.stop()
+        self._tick_cb()
+
+    def stop(self):
+        if self._source is not None:
+            gobject.source_remove(self._source)
+            self._source = None
+
+    def _tick_cb(self):
+        t0 = self._get_t0()
+        period = self._get_period()
+        now = self._clock.time()
+        time_to_next = next_boundary(t0, period, now) - now
+        secondsleft = int(math.ceil(time_to_next))
+        if secondsleft != self._shown:
+            self._shown = secondsleft
+            self._label.set_markup(' <span size="xx-large">%s</span>s' % secondsleft)
+        # Wake up again when the number of whole seconds left changes.
+        delay = time_to_next - math.floor(time_to_next) or 1.0
+        self._source = gobject.timeout_add(_msec(delay), self._tick_cb)
+        return False
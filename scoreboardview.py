@@ -0,0 +1,142 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""A scoreboard widget that follows a shared scoreboard incrementally."""
+
+import gtk
+import gobject
+
+from gettext import gettext as _
+
+from leaderboard import Leaderboard
+
+COLUMN_NAME       = 0
+COLUMN_LAST_SCORE = 1
+COLUMN_TOTAL      = 2
+COLUMN_LAST_TIME  = 3
+
+class ScoreboardView(gtk.TreeView):
+    """A TreeView over one persistent model with a row per player.
+
+    The view listens to the scoreboard CausalDict and only touches the
+    rows of players whose ImmutableScore actually changed, so selection and
+    scroll position survive updates and nothing is redone when the
+    scoreboard is quiet.
+
+    If limit is given, only the limit best players are shown, best first,
+    followed by the player named me if they are not among them.  Players
+    are ranked by a Leaderboard, so large sessions are never sorted as a
+    whole."""
+
+    def __init__(self, scoreboard, me=None, limit=None):
+        self.model = gtk.TreeStore(gobject.TYPE_STRING, # name
+                                   gobject.TYPE_INT,    # last round score
+                                   gobject.TYPE_INT,    # total score
+                                   gobject.TYPE_FLOAT)  # time for last question
+        super(ScoreboardView, self).__init__(self.model)
+
+        cellrenderer = gtk.CellRendererText()
+        col1 = gtk.TreeViewColumn(_("Name"), cellrenderer, text=COLUMN_NAME)
+        col2 = gtk.TreeViewColumn(_("Round score"), cellrenderer, text=COLUMN_LAST_SCORE)
+        col3 = gtk.TreeViewColumn(_("Total score"), cellrenderer, text=COLUMN_TOTAL)
+        col4 = gtk.TreeViewColumn(_("Time for answering last question"), cellrenderer, text=COLUMN_LAST_TIME)
+        self.append_column(col1)
+        self.append_column(col2)
+        self.append_column(col3)
+        self.append_column(col4)
+
+        self._me = me
+        self._limit = limit
+        self._leaderboard = Leaderboard()
+        # Values of every known player, and the rows of the shown ones.
+        # TreeStore iters stay valid while their row exists.
+        self._scores = {}
+        self._rows = {}
+        self._shown = []
+
+        for person, score in scoreboard.iteritems():
+            self.update_score(person, score)
+        scoreboard.register_listener(self._scoreboard_cb)
+
+    def _scoreboard_cb(self, added, removed):
+        for person in removed:
+            if person not in added:
+                self.remove_player(person)
+        for person, score in added.iteritems():
+            self.update_score(person, score)
+
+    def update_score(self, person, score):
+        """Show score for person, touching only the cells that changed."""
+        values = (score.last_score, score.cumulative_score, score.last_time)
+        old_values = self._scores.get(person)
+        if old_values == values:
+            return
+        self._scores[person] = values
+
+        shown_before = person in self._rows
+        if self._limit is None:
+            if not shown_before:
+                self._add_row(person)
+                return
+        elif self._leaderboard.update(person, score.cumulative_score):
+            self._refresh_rows()
+
+        it = self._rows.get(person)
+        if it is None or not shown_before:
+            return
+        for column, value, old_value in zip(
+                (COLUMN_LAST_SCORE, COLUMN_TOTAL, COLUMN_LAST_TIME),
+                values, old_values):
+            if value != old_value:
+                self.model.set_value(it, column, value)
+
+    def set_last_time(self, person, last_time):
+        """Show an answering time for person that is not part of a score,
+        such as the time taken by a wrong answer."""
+        if person in self._scores:
+            self._scores[person] = self._scores[person][:2] + (last_time,)
+        it = self._rows.get(person)
+        if it is not None:
+            self.model.set_value(it, COLUMN_LAST_TIME, last_time)
+
+    def remove_player(self, person):
+        self._scores.pop(person, None)
+        if self._limit is None:
+            self._remove_row(person)
+        else:
+            self._leaderboard.remove(person)
+            self._refresh_rows()
+
+    def _add_row(self, person):
+        self._rows[person] = self.model.append(None, (person,) + self._scores[person])
+        self._shown.append(person)
+
+    def _remove_row(self, person):
+        it = self._rows.pop(person, None)
+        if it is not None:
+            self._shown.remove(person)
+            self.model.remove(it)
+
+    def _refresh_rows(self):
+        """Make the rows show the best players, in order."""
+        wanted = self._leaderboard.top(self._limit)
+        if self._me in self._scores and self._me not in wanted:
+            wanted.append(self._me)
+        if wanted == self._shown:
+            return
+
+        wanted_set = set(wanted)
+        for person in [p for p in self._shown if p not in wanted_set]:
+            self._remove_row(person)
+        for person in wanted:
+            if person not in self._rows:
+                self._add_row(person)
+        if self._shown != wanted:
+            # new_order[new position] = old position
+            position = dict((p, i) for i, p in enumerate(self._shown))
+            self.model.reorder(None, [position[p] for p in wanted])
+            self._shown = wanted
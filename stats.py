@@ -0,0 +1,130 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Streaming answer statistics.
+
+Everything here takes constant memory per player and per puzzle mode,
+and constant time per answer, so statistics can be kept for a whole
+session without logging individual events."""
+
+import json
+import math
+
+class RunningStats(object):
+    """Count, mean, variance, minimum and maximum of a stream of numbers,
+    by Welford's method."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+
+    def _get_variance(self):
+        if self.count < 2:
+            return 0.0
+        return self._m2 / (self.count - 1)
+
+    variance = property(_get_variance)
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean,
+                "stddev": math.sqrt(self.variance),
+                "min": self.min, "max": self.max}
+
+class LogHistogram(object):
+    """Counts of values in logarithmic buckets.
+
+    Bucket 0 holds values below smallest; bucket i > 0 holds values in
+    [smallest * ratio**(i-1), smallest * ratio**i), and the last bucket
+    everything above.  The defaults cover 0.1 to about 100 seconds in
+    steps of a factor sqrt(2)."""
+
+    def __init__(self, smallest=0.1, ratio=math.sqrt(2), buckets=22):
+        self.smallest = smallest
+        self.ratio = ratio
+        self.counts = [0] * buckets
+        self._log_ratio = math.log(ratio)
+
+    def bucket(self, x):
+        if x < self.smallest:
+            return 0
+        i = int(math.log(x / self.smallest) / self._log_ratio) + 1
+        return min(i, len(self.counts) - 1)
+
+    def add(self, x):
+        self.counts[self.bucket(x)] += 1
+
+    def edges(self):
+        """The lower edge of each bucket after the first."""
+        return [self.smallest * self.ratio ** i
+                for i in xrange(len(self.counts) - 1)]
+
+    def to_dict(self):
+        return {"edges": self.edges(), "counts": list(self.counts)}
+
+class AnswerStats(object):
+    """Accuracy and latency of the answers of one player or mode."""
+
+    def __init__(self):
+        self.answers = 0
+        self.correct = 0
+        self.latency = RunningStats()
+        self.histogram = LogHistogram()
+
+    def add(self, correct, latency):
+        self.answers += 1
+        if correct:
+            self.correct += 1
+        self.latency.add(latency)
+        self.histogram.add(latency)
+
+    def to_dict(self):
+        return {"answers": self.answers, "correct": self.correct,
+                "latency": self.latency.to_dict(),
+                "histogram": self.histogram.to_dict()}
+
+class SessionStats(object):
+    """Answer statistics for each player and for each puzzle mode."""
+
+    def __init__(self):
+        self.players = {}
+        self.modes = {}
+
+    def _get(self, table, key):
+        stats = table.get(key)
+        if stats is None:
+            stats = table[key] = AnswerStats()
+        return stats
+
+    def record(self, player, mode, correct, latency):
+        """Record one answer.  mode may be None when it is not known, as
+        for answers of other players, which are only seen as score
+        changes."""
+        self._get(self.players, player).add(correct, latency)
+        if mode is not None:
+            self._get(self.modes, mode).add(correct, latency)
+
+    def to_dict(self):
+        return {"players": dict((k, v.to_dict())
+                                for k, v in self.players.iteritems()),
+                "modes": dict((k, v.to_dict())
+                              for k, v in self.modes.iteritems())}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), sort_keys=True)
@@ -0,0 +1,100 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Tests for session checkpoints.  They run on the stand-ins for gobject
+and Groupthink in benchmarks/fakes."""
+
+import os
+import sys
+import unittest
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(_root, "benchmarks", "fakes"), _root]
+
+import gobject
+from dobject.groupthink import HighScore
+from checkpoint import Checkpointer, encode_snapshot, decode_snapshot
+
+class Clock(object):
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+class CheckpointerTest(unittest.TestCase):
+
+    def setUp(self):
+        gobject.reset()
+        self.clock = Clock(100.0)
+        self.shared = HighScore("", 0)
+        self.state = ({"ana": [1, 1, 1.0]}, ["ab" * 20])
+        self.loaded = []
+        self.checkpointer = Checkpointer(self.shared, self.clock,
+                                         lambda: self.state,
+                                         lambda *args: self.loaded.append(args),
+                                         interval=30)
+        self.checkpointer.start()
+
+    def tearDown(self):
+        self.checkpointer.stop()
+        gobject.reset()
+
+    def arrive(self, scores, when):
+        self.shared.receive(encode_snapshot(scores, []), when)
+
+    def run_interval(self):
+        self.clock.now += 30
+        gobject.run_due(gobject.now() + 30)
+
+    def written(self):
+        return self.shared.get_score() == self.clock.now
+
+    def test_clean_does_not_write(self):
+        self.run_interval()
+        self.assertFalse(self.written())
+
+    def test_dirty_writes(self):
+        self.checkpointer.mark_dirty()
+        self.run_interval()
+        self.assertTrue(self.written())
+        self.assertEqual(decode_snapshot(self.shared.get_value()),
+                         (self.state[0], self.state[1]))
+        # Clean again until the next change.
+        self.run_interval()
+        self.assertFalse(self.written())
+
+    def test_older_checkpoint_keeps_ours_pending(self):
+        self.checkpointer.mark_dirty()
+        # Taken before our change, so it does not have it.
+        self.arrive({}, 99.0)
+        self.run_interval()
+        self.assertTrue(self.written())
+
+    def test_newer_checkpoint_clears_ours(self):
+        self.checkpointer.mark_dirty()
+        self.arrive({}, 101.0)
+        self.run_interval()
+        self.assertFalse(self.written())
+        # A later change is pending again.
+        self.checkpointer.mark_dirty()
+        self.run_interval()
+        self.assertTrue(self.written())
+
+    def test_first_checkpoint_loaded(self):
+        self.arrive({"bo": [2, 1, 0.5]}, 50.0)
+        self.arrive({"cy": [3, 1, 0.5]}, 60.0)
+        self.assertEqual(self.loaded, [({"bo": [2, 1, 0.5]}, [])])
+
+    def test_not_loaded_after_writing(self):
+        self.checkpointer.write()
+        self.arrive({"bo": [2, 1, 0.5]}, 200.0)
+        self.assertEqual(self.loaded, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Tests for answer grading."""
+
+import os
+import sys
+import unittest
+from fractions import Fraction
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grading import parse_answer, normalize_answer, is_correct, BatchGrader
+
+# (input, value), with None for input that is not a number.
+ANSWERS = [
+    # Integers
+    ("42", 42), (" 42 ", 42), ("007", 7), ("-3", -3), ("+3", 3),
+    ("- 3", -3), (u"\u22123", -3), (u"\u20133", -3),
+    ("1307674368000", 1307674368000),
+    # Fractions and mixed numbers
+    ("3/4", Fraction(3, 4)), ("6 / 8", Fraction(3, 4)),
+    ("-1/2", Fraction(-1, 2)), ("1 1/2", Fraction(3, 2)),
+    ("-2 1/4", Fraction(-9, 4)), ("3/0", None), ("1 1/0", None),
+    # Decimals
+    ("0.75", Fraction(3, 4)), (".75", Fraction(3, 4)),
+    ("0,75", Fraction(3, 4)), ("-0.5", Fraction(-1, 2)), ("12.", 12),
+    ("0,500", Fraction(1, 2)), ("1234,567", Fraction(1234567, 1000)),
+    # Groups of thousands
+    ("1,500", 1500), ("-1,500", -1500), ("5,040", 5040),
+    ("1,307,674,368,000", 1307674368000), ("1,50", Fraction(3, 2)),
+    # Malformed
+    ("", None), ("abc", None), ("01,000", None), ("00,500", None),
+    ("012,345", None), ("1,,500", None), ("1,500.5", None),
+    ("1,000,00", None), ("1.5.5", None), ("1e3", None), ("inf", None),
+    ("nan", None), ("--3", None), ("1/2/3", None), ("3 -", None),
+]
+
+class ParseTest(unittest.TestCase):
+
+    def test_table(self):
+        for text, expected in ANSWERS:
+            self.assertEqual(parse_answer(text), expected, repr(text))
+
+    def test_utf8(self):
+        self.assertEqual(parse_answer(u"\u22127".encode("utf-8")), -7)
+
+class GradeTest(unittest.TestCase):
+
+    def test_normalize(self):
+        self.assertEqual(normalize_answer(5), 5)
+        self.assertEqual(normalize_answer(0.1), Fraction(1, 10))
+        self.assertEqual(normalize_answer(Fraction(2, 3)), Fraction(2, 3))
+        self.assertEqual(normalize_answer("x"), None)
+
+    def test_is_correct(self):
+        self.assertTrue(is_correct(normalize_answer(1500), "1,500"))
+        self.assertTrue(is_correct(normalize_answer(0.5), "1/2"))
+        self.assertFalse(is_correct(normalize_answer(1), "01,000"))
+        self.assertFalse(is_correct(normalize_answer(1), "one"))
+
+    def test_batch(self):
+        pairs = [("1500", "1,500"), ("1", "01,000"), ("x", "x"),
+                 ("0.25", "1/4"), ("1500", "1,500")]
+        self.assertEqual(list(BatchGrader().grade_all(pairs)),
+                         [True, False, False, True, True])
+
+if __name__ == "__main__":
+    unittest.main()
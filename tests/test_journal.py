@@ -0,0 +1,117 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Tests for the answer journal."""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from fractions import Fraction
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import JournalWriter, JournalReader, JournalError, \
+    RECORD_SIZE
+
+MODE = "ab" * 20
+# (index, difficulty, answer, correct, latency)
+ANSWERS = [(0, "easy", 5, True, 1.5),
+           (1, "medium", Fraction(-3, 4), False, 0.25),
+           (3, "hard", None, False, 9.0),
+           (4, "easy", 2 ** 70, True, 2.0)]
+
+def _open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "journal.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, answers):
+        writer = JournalWriter(self.path)
+        for index, difficulty, answer, correct, latency in answers:
+            writer.append(index, MODE, difficulty, answer, correct, latency)
+        writer.close()
+
+    def read(self):
+        reader = JournalReader(self.path)
+        try:
+            return list(reader)
+        finally:
+            reader.close()
+
+    def check(self, records, answers):
+        self.assertEqual(len(records), len(answers))
+        for record, (index, difficulty, answer, correct, latency) in \
+                zip(records, answers):
+            self.assertEqual(record.index, index)
+            self.assertEqual(record.mode, MODE)
+            self.assertEqual(record.difficulty, difficulty)
+            if answer is not None and abs(answer) >= 2 ** 63:
+                # Too large to store.
+                answer = None
+            self.assertEqual(record.answer, answer)
+            self.assertEqual(record.correct, correct)
+            self.assertEqual(record.latency, latency)
+
+    def test_round_trip(self):
+        self.write(ANSWERS[:2])
+        self.write(ANSWERS[2:])
+        self.check(self.read(), ANSWERS)
+        reader = JournalReader(self.path)
+        self.assertEqual(len(reader), len(ANSWERS))
+        self.assertEqual(reader[-1].index, 4)
+        self.assertRaises(IndexError, reader.__getitem__, len(ANSWERS))
+        reader.close()
+
+    def test_torn_record(self):
+        self.write(ANSWERS[:2])
+        with open(self.path, "ab") as file:
+            file.write("x" * (RECORD_SIZE // 2))
+        # Readers skip the torn record, and the next writer drops it.
+        self.check(self.read(), ANSWERS[:2])
+        self.write(ANSWERS[2:3])
+        self.check(self.read(), ANSWERS[:3])
+        self.assertEqual((os.path.getsize(self.path) - 8) % RECORD_SIZE, 0)
+
+    def test_empty(self):
+        open(self.path, "wb").close()
+        self.assertEqual(self.read(), [])
+        self.write(ANSWERS[:1])
+        self.check(self.read(), ANSWERS[:1])
+
+    def test_bad_header(self):
+        for data in ["garbage!" + "x" * RECORD_SIZE, "ARJ"]:
+            with open(self.path, "wb") as file:
+                file.write(data)
+            self.assertRaises(JournalError, JournalReader, self.path)
+            self.assertRaises(JournalError, JournalWriter, self.path)
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs /proc")
+    def test_bad_header_closes(self):
+        with open(self.path, "wb") as file:
+            file.write("garbage!" + "x" * RECORD_SIZE)
+        before = _open_fds()
+        for opener in JournalReader, JournalWriter:
+            try:
+                opener(self.path)
+            except JournalError:
+                # The traceback still holds the half-made object, so only
+                # closing it by hand frees its file here.
+                self.assertEqual(_open_fds(), before, opener.__name__)
+            else:
+                self.fail("%s accepted a bad header" % opener.__name__)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Tests for quizengine.  Run from the top directory with
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quizengine import QuizEngine, KeyedPermutation, QuestionSchedule
+
+GOOD = 'name = "good"\nsort_key = 1\n' \
+       'def get_problem(self, difficulty):\n    return "1 + 1", 2\n'
+
+class BrokenPuzzleTest(unittest.TestCase):
+    """Puzzles come from other players; a broken one must not stop the
+    others from loading."""
+
+    BROKEN = ['name = "syntax"\nsort_key = 2\ndef get_problem(:\n',
+              'sort_key = 3\n']
+
+    def check(self, engine, broken):
+        for text in broken:
+            self.assertEqual(engine.add_puzzle(text), None)
+        hash = engine.add_puzzle(GOOD)
+        self.assertNotEqual(hash, None)
+        self.assertEqual(engine.puzzle_hashes(), [hash])
+
+    def test_sandboxed(self):
+        # Without running the puzzle, its name must be a literal.
+        self.check(QuizEngine(execute=False),
+                   self.BROKEN + ['name = "bad" + ""\nsort_key = 4\n'])
+
+    def test_in_process(self):
+        self.check(QuizEngine(execute=True),
+                   self.BROKEN + ['name = "raises"\nsort_key = 5\n'
+                                  'raise RuntimeError("boo")\n'])
+
+class KeyedPermutationTest(unittest.TestCase):
+
+    def test_bijection(self):
+        for size in range(1, 34) + [100, 257, 1000, 4097]:
+            for key in (0, 1, 0xdeadbeef, 2 ** 64 - 1):
+                values = list(KeyedPermutation(size, key))
+                self.assertEqual(sorted(values), range(size),
+                                 "size %d, key %d" % (size, key))
+
+    def test_bounds(self):
+        permutation = KeyedPermutation(5, 7)
+        self.assertEqual(len(permutation), 5)
+        self.assertRaises(IndexError, permutation.__getitem__, 5)
+        self.assertRaises(IndexError, permutation.__getitem__, -1)
+        self.assertRaises(ValueError, KeyedPermutation, 0, 7)
+
+    def test_stable(self):
+        # Every client must draw the same questions from the same key.
+        self.assertEqual(list(KeyedPermutation(10, 12345)),
+                         [7, 2, 8, 9, 1, 5, 3, 4, 6, 0])
+        self.assertEqual(list(KeyedPermutation(7, 0)),
+                         [4, 0, 6, 5, 2, 3, 1])
+        large = KeyedPermutation(1000003, 42)
+        self.assertEqual([large[i] for i in (0, 1, 500000, 1000002)],
+                         [860611, 771737, 983783, 607797])
+        self.assertEqual(list(KeyedPermutation(100, 99)),
+                         list(KeyedPermutation(100, 99)))
+        self.assertNotEqual(list(KeyedPermutation(100, 99)),
+                            list(KeyedPermutation(100, 98)))
+
+    def test_ints(self):
+        for value in KeyedPermutation(50, 2 ** 64 - 1):
+            self.assertEqual(type(value), int)
+
+class QuestionScheduleTest(unittest.TestCase):
+
+    MODES = ["a", "b", "c"]
+    DIFFICULTIES = ["easy", "medium", "hard"]
+
+    def check(self, modes, difficulties, weights):
+        schedule = QuestionSchedule(modes, difficulties, weights)
+        ranks = [[] for i in xrange(schedule.pairs)]
+        for slot in xrange(schedule.size):
+            pair, rank = schedule.lookup(slot)
+            ranks[pair].append(rank)
+        expected = [weights.get(mode, 1) * weights.get(difficulty, 1)
+                    for mode in modes for difficulty in difficulties]
+        for i in xrange(schedule.pairs):
+            # Each pair's share of the block is in proportion to its
+            # weight, and its ranks number its slots once each.
+            self.assertEqual(len(ranks[i]) * sum(expected),
+                             expected[i] * schedule.size, weights)
+            self.assertEqual(sorted(ranks[i]), range(schedule.slots[i]))
+        return schedule
+
+    def test_equal(self):
+        schedule = self.check(self.MODES, self.DIFFICULTIES, {})
+        self.assertEqual(schedule.size, 9)
+        self.assertEqual(schedule.slots, [1] * 9)
+        self.assertEqual(schedule.pair(5), ("b", "hard"))
+
+    def test_weights(self):
+        for weights in [{"a": 2}, {"b": 3, "hard": 2}, {"c": 99},
+                        {"a": 4, "b": 6, "c": 8}, {"medium": 7, "a": 5},
+                        {"a": 99, "b": 98, "c": 97, "easy": 96,
+                         "medium": 95, "hard": 94}]:
+            self.check(self.MODES, self.DIFFICULTIES, weights)
+
+    def test_common_factor(self):
+        # Weights 2 and 4 share a block with weights 1 and 2.
+        schedule = self.check(["a", "b"], ["easy"], {"a": 2, "b": 4})
+        self.assertEqual(schedule.size, 6)
+        self.assertEqual(schedule.slots, [2, 4])
+
+    def test_one_pair(self):
+        schedule = self.check(["a"], ["hard"], {"a": 5})
+        self.assertEqual(schedule.size, 1)
+        self.assertEqual(schedule.lookup(0), (0, 0))
+
+    def test_empty(self):
+        self.assertEqual(QuestionSchedule([], ["easy"]).size, 0)
+
+class ProblemsTest(unittest.TestCase):
+
+    def puzzles(self, engine, entry):
+        texts = ['name = "%s"\nsort_key = 1\n' % name + entry
+                 for name in ("a", "b")]
+        return [engine.add_puzzle(text) for text in texts]
+
+    def check(self, entry):
+        engine = QuizEngine()
+        a, b = self.puzzles(engine, entry)
+        first = list(engine.problems(a, "hard", 50, seed=7))
+        self.assertEqual(list(engine.problems(a, "hard", 50, seed=7)), first)
+        # Puzzles that draw numbers alike still get their own operands.
+        self.assertNotEqual(list(engine.problems(b, "hard", 50, seed=7)),
+                            first)
+
+    def test_batch(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("needs NumPy")
+        self.check('def get_problem(self, difficulty):\n'
+                   '    return "1", 1\n'
+                   'def get_problems(self, difficulty, count):\n'
+                   '    x = self.generate_numbers(difficulty, count)\n'
+                   '    return "%d", (x,), x\n')
+
+    def test_scalar(self):
+        self.check('def get_problem(self, difficulty):\n'
+                   '    x = self.generate_number(difficulty)\n'
+                   '    return "%d" % x, x\n')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Tests for the quiz server."""
+
+import os
+import sys
+import json
+import socket
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quizengine import QuizEngine
+from quizserver import QuizServer, TimerWheel
+
+FOUR = 'name = "four"\nsort_key = 1\n' \
+       'def get_problem(self, difficulty):\n' \
+       '    return "2 + 2", 4\n'
+
+class TimerWheelTest(unittest.TestCase):
+
+    # Ticks and times are binary fractions, so that rounding cannot move
+    # an item to the next tick.
+    def test_order(self):
+        wheel = TimerWheel(tick=0.25, slots=8, now=0.0)
+        wheel.schedule(0.625, "b")
+        wheel.schedule(0.375, "a")
+        wheel.schedule(0.625, "c")
+        self.assertEqual(wheel.advance(0.25), [])
+        self.assertEqual(wheel.advance(0.5), ["a"])
+        self.assertEqual(wheel.advance(0.625), [])
+        self.assertEqual(wheel.advance(0.75), ["b", "c"])
+
+    def test_never_early(self):
+        wheel = TimerWheel(tick=0.25, slots=8, now=1.0)
+        # Times already past fire on the next tick.
+        wheel.schedule(0.5, "late")
+        self.assertEqual(wheel.advance(1.125), [])
+        self.assertEqual(wheel.advance(1.25), ["late"])
+
+    def test_rollover(self):
+        # Both land in the same slot, a full turn of the wheel apart.
+        wheel = TimerWheel(tick=0.25, slots=8, now=0.0)
+        wheel.schedule(0.5, "near")
+        wheel.schedule(2.5, "far")
+        self.assertEqual(wheel.advance(0.5), ["near"])
+        self.assertEqual(wheel.advance(2.25), [])
+        self.assertEqual(wheel.advance(2.5), ["far"])
+
+    def test_long_jump(self):
+        wheel = TimerWheel(tick=0.25, slots=8, now=0.0)
+        for i in xrange(20):
+            wheel.schedule(0.25 * (i + 1), i)
+        self.assertEqual(sorted(wheel.advance(100.0)), range(20))
+        self.assertEqual(wheel.advance(200.0), [])
+
+class Client(object):
+    """A blocking client that pumps the server while it waits."""
+
+    def __init__(self, server):
+        self.server = server
+        self.sock = socket.create_connection(server.address)
+        self.sock.settimeout(0)
+        self.buffer = ""
+        self.server.run_once()
+
+    def send(self, message):
+        if isinstance(message, dict):
+            message = json.dumps(message)
+        self.sock.sendall(message + "\n")
+
+    def receive(self, op=None):
+        """The next message, or the next with that op."""
+        for i in xrange(200):
+            while "\n" in self.buffer:
+                line, self.buffer = self.buffer.split("\n", 1)
+                message = json.loads(line)
+                if op is None or message["op"] == op:
+                    return message
+            self.server.run_once()
+            try:
+                data = self.sock.recv(65536)
+            except socket.error:
+                continue
+            if not data:
+                raise EOFError
+            self.buffer += data
+        raise AssertionError("no %s message" % (op or "message"))
+
+    def close(self):
+        self.sock.close()
+
+class QuizServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        engine = QuizEngine()
+        engine.add_puzzle(FOUR)
+        self.server = QuizServer(engine, port=0, tick=0.01,
+                                 clock=lambda: self.now)
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.server.close_all()
+
+    def connect(self):
+        client = Client(self.server)
+        self.clients.append(client)
+        return client
+
+    def test_exchange(self):
+        ana, bo = self.connect(), self.connect()
+        ana.send({"op": "join", "room": "r", "player": "ana",
+                  "period": 10, "modes": ["four"]})
+        joined = ana.receive("joined")
+        self.assertEqual(joined["modes"], ["four"])
+        self.assertEqual(joined["difficulties"], ["easy"])
+        question = ana.receive("question")
+        self.assertEqual(question["question"], "2 + 2")
+        bo.send({"op": "join", "room": "r", "player": "bo"})
+        self.assertEqual(bo.receive("question")["index"], question["index"])
+
+        self.now += 2
+        ana.send({"op": "answer", "answer": "4"})
+        result = ana.receive("result")
+        self.assertTrue(result["correct"])
+        bo.send({"op": "answer", "answer": "5"})
+        self.assertFalse(bo.receive("result")["correct"])
+
+        bo.send({"op": "scores"})
+        scores = bo.receive("scores")["scores"]
+        self.assertEqual(scores["ana"][:2], [1, 1])
+        self.assertEqual(scores["bo"][:2], [0, 0])
+
+    def test_bad_requests(self):
+        client = self.connect()
+        for line in ["garbage", "[1, 2]", json.dumps({"op": "bogus"}),
+                     json.dumps({"op": "answer", "answer": "4"}),
+                     json.dumps({"op": "join", "room": "r"}),
+                     json.dumps({"op": "join", "room": "r", "player": "p",
+                                 "weights": [1]}),
+                     json.dumps({"op": "join", "room": "r", "player": "p",
+                                 "difficulties": "easy"}),
+                     json.dumps({"op": "join", "room": "r", "player": "p",
+                                 "modes": ["nonesuch"]}),
+                     json.dumps({"op": "join", "room": "r", "player": "p",
+                                 "period": "soon"})]:
+            client.send(line)
+            self.assertEqual(client.receive()["op"], "error", line[:40])
+        self.assertEqual(self.server.rooms, {})
+        # The connection still works.
+        client.send({"op": "join", "room": "r", "player": "p"})
+        self.assertEqual(client.receive()["op"], "joined")
+
+    def test_long_line(self):
+        client = self.connect()
+        client.send("x" * 5000)
+        self.assertEqual(client.receive()["message"], "line too long")
+        self.assertRaises(EOFError, client.receive)
+
+if __name__ == "__main__":
+    unittest.main()
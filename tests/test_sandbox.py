@@ -0,0 +1,100 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Tests for the puzzle sandbox."""
+
+import os
+import sys
+import mmap
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quizengine import QuizEngine
+from sandbox import PuzzleSandbox
+
+GOOD = 'name = "good"\nsort_key = 1\n' \
+       'def get_problem(self, difficulty):\n' \
+       '    x = self.generate_number(difficulty)\n' \
+       '    padding = " " * (4 << 20)\n' \
+       '    return "%s + 1" % x, x + 1\n'
+
+SLOW_LOAD = 'name = "slow"\nsort_key = 1\n' \
+            'def precompute(self, difficulty):\n' \
+            '    import time\n' \
+            '    time.sleep(0.5)\n' \
+            '    return []\n' \
+            'def get_problem(self, difficulty):\n' \
+            '    return "1 + 1", 2\n'
+
+class SandboxTest(unittest.TestCase):
+
+    def run_job(self, sandbox, engine, hash):
+        results = []
+        sandbox.submit(0.0, 0, 3, [hash], ["easy"], {}, results.append)
+        deadline = time.time() + 10
+        while not results and time.time() < deadline:
+            sandbox.poll()
+            time.sleep(0.01)
+        return results
+
+    def test_large_parent(self):
+        # Reserved but never touched, so it costs address space only.
+        ballast = mmap.mmap(-1, 320 << 20)
+        try:
+            engine = QuizEngine(execute=False)
+            hash = engine.add_puzzle(GOOD)
+            sandbox = PuzzleSandbox(engine, workers=1, timeout=5.0,
+                                    memory_limit=256 << 20)
+            try:
+                results = self.run_job(sandbox, engine, hash)
+            finally:
+                sandbox.close()
+        finally:
+            ballast.close()
+        self.assertEqual(len(results), 1)
+        self.assertNotEqual(results[0], None)
+        self.assertEqual(len(results[0]), 3)
+
+    def test_slow_precompute(self):
+        # Loading gets its own budget beyond the per-job timeout.
+        engine = QuizEngine(execute=False)
+        hash = engine.add_puzzle(SLOW_LOAD)
+        sandbox = PuzzleSandbox(engine, workers=1, timeout=0.5,
+                                load_timeout=5.0)
+        try:
+            results = self.run_job(sandbox, engine, hash)
+        finally:
+            sandbox.close()
+        self.assertEqual(len(results), 1)
+        self.assertNotEqual(results[0], None)
+
+    def test_unwanted_jobs(self):
+        engine = QuizEngine(execute=False)
+        hash = engine.add_puzzle(GOOD)
+        sandbox = PuzzleSandbox(engine, workers=1, timeout=5.0)
+        stale, fresh = [], []
+        try:
+            sandbox.submit(0.0, 0, 3, [hash], ["easy"], {}, stale.append,
+                           lambda: False)
+            sandbox.submit(0.0, 0, 3, [hash], ["easy"], {}, stale.append,
+                           lambda: False)
+            sandbox.submit(0.0, 0, 3, [hash], ["easy"], {}, fresh.append)
+            deadline = time.time() + 10
+            while not fresh and time.time() < deadline:
+                sandbox.poll()
+                time.sleep(0.01)
+            self.assertFalse(sandbox.busy)
+        finally:
+            sandbox.close()
+        self.assertEqual(stale, [])
+        self.assertEqual(len(fresh), 1)
+        self.assertEqual(len(fresh[0]), 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Clocks that are not disturbed by adjustments of the system time.
+
+Answer latencies are measured with monotonic(), which never jumps.  The
+shared Groupthink clock is followed through a SessionClock, which runs on
+monotonic() and only gradually absorbs small corrections, so question
+boundaries do not move when NTP nudges a laptop's clock."""
+
+import time
+
+def _find_monotonic():
+    try:
+        # Python 3.3 and later.
+        return time.monotonic
+    except AttributeError:
+        pass
+    try:
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        librt = ctypes.CDLL(ctypes.util.find_library('rt') or 'librt.so.1',
+                            use_errno=True)
+        clock_gettime = librt.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        CLOCK_MONOTONIC = 1 # from <linux/time.h>
+
+        def monotonic():
+            ts = timespec()
+            if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+                raise OSError(ctypes.get_errno(), "clock_gettime failed")
+            return ts.tv_sec + ts.tv_nsec * 1e-9
+
+        monotonic()
+        return monotonic
+    except (ImportError, OSError, AttributeError):
+        # No monotonic clock: fall back to the wall clock.
+        return time.time
+
+monotonic = _find_monotonic()
+
+class SessionClock(object):
+    """The shared clock of a session, read through the monotonic clock.
+
+    The offset between timer (the Groupthink clock, or anything with a
+    time() method) and monotonic() is sampled every resync_interval
+    seconds.  Changes smaller than max_slew seconds are absorbed a
+    fraction at a time, and the rate at which the offset keeps changing
+    is estimated, so that time() follows a drifting clock smoothly in
+    between samples.  Larger changes mean the shared clock was really
+    set, and are taken at once."""
+
+    def __init__(self, timer, resync_interval=5.0, max_slew=1.0,
+                 gain=0.25, clock=None):
+        self._timer = timer
+        self._clock = clock or monotonic
+        self._resync_interval = resync_interval
+        self._max_slew = max_slew
+        self._gain = gain
+        self._drift = 0.0
+        self._sampled_at = self._clock()
+        self._offset = timer.time() - self._sampled_at
+
+    def _get_drift(self):
+        """Estimated change of the offset, in seconds per second."""
+        return self._drift
+
+    drift = property(_get_drift)
+
+    def time(self):
+        now = self._clock()
+        if now - self._sampled_at >= self._resync_interval:
+            self.resync(now)
+        return now + self._offset + self._drift * (now - self._sampled_at)
+
+    def resync(self, now=None):
+        """Sample the shared clock now."""
+        if now is None:
+            now = self._clock()
+        elapsed = now - self._sampled_at
+        predicted = self._offset + self._drift * elapsed
+        error = (self._timer.time() - now) - predicted
+        if abs(error) > self._max_slew:
+            self._offset = predicted + error
+            self._drift = 0.0
+        else:
+            self._offset = predicted + self._gain * error
+            if elapsed > 0:
+                # A smaller gain for the rate keeps the estimate from
+                # overshooting after a correction.
+                self._drift += self._gain * self._gain / 2 * error / elapsed
+        self._sampled_at = now
+
+class StartupTimer(object):
+    """Wall time spent in each phase of starting the activity.
+
+    mark(phase) ends a phase that began at the previous mark (or when the
+    timer was made); report() is a one-line breakdown for the log."""
+
+    def __init__(self):
+        self.phases = []
+        self._last = monotonic()
+
+    def add(self, phase, seconds):
+        """Record a phase timed elsewhere."""
+        self.phases.append((phase, seconds))
+
+    def mark(self, phase):
+        now = monotonic()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def _get_total(self):
+        return sum(seconds for phase, seconds in self.phases)
+
+    total = property(_get_total)
+
+    def report(self):
+        return "%.0f ms (%s)" % (self.total * 1000, ", ".join(
+            "%s %.0f ms" % (phase, seconds * 1000)
+            for phase, seconds in self.phases))
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# Copyright (C) 2009, Chris Ball <chris@printf.net>
+# Copyright (C) 2009, Benjamin M. Schwartz <bmschwar@fas.harvard.edu>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+"""Export questions and answers as worksheets, without a display.
+
+Questions are generated exactly as in a live session: question N of the
+session whose startpoint is T0 is the one shown at T0 + period * N, so a
+sheet exported with the startpoint of a session matches what it showed.
+
+    python worksheet.py --seed 1254351234.5 --modes "+,x" \\
+        --difficulties easy,medium --count 100000 --format csv --jobs 4
+
+The weights of a session are given as --weights "x=3,medium=2".
+
+Large ranges are cut into slices that are generated by a pool of worker
+processes.  Slices are written in order, and only a few of them are held
+in memory at any time.  With --cache, compiled puzzles and the tables of
+puzzles with a precompute() hook are kept in a directory, where the
+workers (and later runs, or the activity's data/puzzles) find them."""
+
+import sys
+import csv
+import json
+import optparse
+import StringIO
+import multiprocessing
+
+from quizengine import QuizEngine, DIFFICULTIES, MAX_WEIGHT
+from puzzlecache import PuzzleCache
+from catalogue import PuzzleCatalogue
+
+FORMATS = ("csv", "jsonl", "text")
+SLICE_SIZE = 5000
+
+def _csv_record(record):
+    out = StringIO.StringIO()
+    csv.writer(out).writerow(record)
+    return out.getvalue()
+
+def _jsonl_record(record):
+    index, name, difficulty, question, answer = record
+    return json.dumps({"index": index, "puzzle": name,
+                       "difficulty": difficulty, "question": question,
+                       "answer": answer}) + "\n"
+
+def _text_record(record):
+    index, name, difficulty, question, answer = record
+    lines = question.strip("\n").split("\n")
+    text = "%d)\t%s\n" % (index, "\n\t".join(lines))
+    return text + "\t= %s\n\n" % answer
+
+_FORMATTERS = {"csv": _csv_record,
+               "jsonl": _jsonl_record,
+               "text": _text_record}
+
+class Exporter(object):
+    """Generates formatted records for ranges of question indices."""
+
+    def __init__(self, paths, t0, modes, difficulties, format, cache=None,
+                 weights=None):
+        self.engine = QuizEngine(t0, PuzzleCache(cache))
+        hashes = PuzzleCatalogue(paths).load(self.engine)
+        names = dict((self.engine.get_puzzle(h)['name'], h) for h in hashes)
+        for mode in modes:
+            if mode in names:
+                mode = names[mode]
+            elif not self.engine.has_puzzle(mode):
+                raise ValueError("Unknown puzzle %r" % mode)
+            self.engine.set_mode_active(mode, True)
+        for difficulty in difficulties:
+            if difficulty not in DIFFICULTIES:
+                raise ValueError("Unknown difficulty %r" % difficulty)
+            self.engine.set_difficulty_active(difficulty, True)
+        for key, weight in (weights or {}).iteritems():
+            key = names.get(key, key)
+            if not (self.engine.has_puzzle(key) or key in DIFFICULTIES):
+                raise ValueError("Unknown weight %r" % key)
+            if not 1 <= weight <= MAX_WEIGHT:
+                raise ValueError("Weights are integers from 1 to %d"
+                                 % MAX_WEIGHT)
+            self.engine.set_weight(key, weight)
+        self.t0 = t0
+        self.format = _FORMATTERS[format]
+
+    def records(self, start, count):
+        engine = self.engine
+        problems = engine.questions(self.t0, start, count)
+        for index, problem in enumerate(problems):
+            if problem is None:
+                raise ValueError("No puzzle or difficulty selected")
+            mode, difficulty, question, answer = problem
+            name = engine.get_puzzle(mode)['name']
+            yield self.format((start + index, name, difficulty,
+                               question, answer))
+
+    def export_slice(self, bounds):
+        start, count = bounds
+        return "".join(self.records(start, count))
+
+_exporter = None
+
+def _init_worker(*args):
+    global _exporter
+    _exporter = Exporter(*args)
+
+def _export_slice(bounds):
+    return _exporter.export_slice(bounds)
+
+def slices(start, count, size=SLICE_SIZE):
+    """Cut [start, start + count) into disjoint (start, count) slices."""
+    end = start + count
+    while start < end:
+        yield start, min(size, end - start)
+        start += size
+
+def export(out, paths, t0, modes, difficulties, format, start, count, jobs=1,
+           cache=None, weights=None):
+    """Write count questions, starting with question number start."""
+    args = (paths, t0, modes, difficulties, format, cache, weights)
+    if format == "csv":
+        out.write(_csv_record(("index", "puzzle", "difficulty",
+                               "question", "answer")))
+    # Build an exporter here even when workers do the work, so that bad
+    # arguments are reported before any worker starts.
+    exporter = Exporter(*args)
+    if jobs <= 1:
+        for bounds in slices(start, count):
+            out.write(exporter.export_slice(bounds))
+        return
+
+    pool = multiprocessing.Pool(jobs, _init_worker, args)
+    try:
+        # Hand out a couple of slices per worker at a time, so that memory
+        # use does not grow with the size of the export.
+        window = []
+        for bounds in slices(start, count):
+            window.append(bounds)
+            if len(window) == 2 * jobs:
+                out.writelines(pool.map(_export_slice, window))
+                window = []
+        out.writelines(pool.map(_export_slice, window))
+    finally:
+        pool.terminate()
+
+def _split(option, opt, value, parser):
+    setattr(parser.values, option.dest,
+            [v.strip() for v in value.split(",") if v.strip()])
+
+def _parse_weights(items):
+    """{key: weight} from a list of "key=weight" strings."""
+    weights = {}
+    for item in items:
+        key, sep, weight = item.rpartition("=")
+        try:
+            if not sep:
+                raise ValueError
+            weights[key.strip()] = int(weight)
+        except ValueError:
+            raise ValueError("Weights are given as name=N, not %r" % item)
+    return weights
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [options]",
+                                   description=__doc__.split("\n\n")[0])
+    parser.add_option("--seed", type="float", default=0.0,
+                      help="the session startpoint (default %default)")
+    parser.add_option("--modes", type="string", action="callback",
+                      callback=_split, default=[],
+                      help="comma-separated puzzle names or hashes")
+    parser.add_option("--difficulties", type="string", action="callback",
+                      callback=_split, default=["easy"],
+                      help="comma-separated difficulties (default easy)")
+    parser.add_option("--weights", type="string", action="callback",
+                      callback=_split, default=[],
+                      help="comma-separated name=N weights of puzzles and "
+                           "difficulties (default 1)")
+    parser.add_option("--start", type="int", default=0,
+                      help="index of the first question (default %default)")
+    parser.add_option("--count", type="int", default=100,
+                      help="number of questions (default %default)")
+    parser.add_option("--format", type="choice", choices=FORMATS,
+                      default="text",
+                      help="one of %s (default %%default)" % ", ".join(FORMATS))
+    parser.add_option("--puzzles", action="append", default=[],
+                      help="puzzle directory or zip bundle (repeatable, "
+                           "default: puzzles)")
+    parser.add_option("--cache", metavar="DIR",
+                      help="directory for compiled puzzles and tables")
+    parser.add_option("--jobs", type="int", default=1,
+                      help="number of worker processes (default %default)")
+    parser.add_option("--output", "-o", default="-",
+                      help="output file (default: standard output)")
+    options, args = parser.parse_args(argv)
+    if args:
+        parser.error("unexpected arguments: %s" % " ".join(args))
+    if not options.modes:
+        parser.error("no puzzles selected, use --modes")
+
+    paths = options.puzzles or ["puzzles"]
+    if options.output == "-":
+        out = sys.stdout
+    else:
+        out = open(options.output, "w")
+    try:
+        export(out, paths, options.seed, options.modes, options.difficulties,
+               options.format, options.start, options.count, options.jobs,
+               options.cache, _parse_weights(options.weights))
+    except ValueError, e:
+        parser.error(str(e))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()